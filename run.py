@@ -1,4 +1,5 @@
 
+import logging
 import sys
 from PySide6.QtWidgets import QApplication
 
@@ -8,11 +9,13 @@ from src.image_manager.main_window import MainWindow
 from src.image_manager import image_utils
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING) # Set to DEBUG for diagnostic output
     image_utils.ensure_library_folders_exist()
     
 
     app = QApplication(sys.argv)
     app.setStyleSheet(MODERN_QSS)
+    app.aboutToQuit.connect(image_utils.metadata_store.close)
     
     window = MainWindow()
     window.show()
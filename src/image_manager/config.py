@@ -10,27 +10,46 @@ LIBRARY_DIR = ROOT_DIR / "image_library"
 INTERNAL_DATA_DIR = ROOT_DIR / ".image_manager_data" # New internal data directory
 THUMBNAIL_DIR = INTERNAL_DATA_DIR / "thumbnails"
 METADATA_FILE = INTERNAL_DATA_DIR / "metadata.json"
+MODEL_CACHE_DIR = INTERNAL_DATA_DIR / "model_cache" # Converted (FP16/INT8) upscale models
 
 
 # --- UI Constants ---
 THUMBNAIL_SIZE = (128, 128)
 GRID_SPACING = (138, 160) # Increased height for filenames
 
+# --- Import ---
+IMAGE_EXTENSIONS = frozenset({".png", ".jpg", ".jpeg", ".bmp", ".gif"}) # Lowercase suffixes accepted for import
+
 # --- Icons ---
-ICONS = {
-    "import": QIcon(str(ICONS_DIR / "import.svg")),
-    "delete": QIcon(str(ICONS_DIR / "delete.svg")),
-    "rename": QIcon(str(ICONS_DIR / "rename.svg")),
-    "zoom-in": QIcon(str(ICONS_DIR / "zoom-in.svg")),
-    "zoom-out": QIcon(str(ICONS_DIR / "zoom-out.svg")),
-    "zoom-actual": QIcon(str(ICONS_DIR / "zoom-actual.svg")),
-    "fit-to-window": QIcon(str(ICONS_DIR / "fit-to-window.svg")),
-    "add": QIcon(str(ICONS_DIR / "add.svg")),
-    "upscale": QIcon(str(ICONS_DIR / "upscale.svg")),
-    "arrow-left": QIcon(str(ICONS_DIR / "arrow-left.svg")),
-    "arrow-right": QIcon(str(ICONS_DIR / "arrow-right.svg")),
+ICON_FILES = {
+    "import": "import.svg",
+    "delete": "delete.svg",
+    "rename": "rename.svg",
+    "zoom-in": "zoom-in.svg",
+    "zoom-out": "zoom-out.svg",
+    "zoom-actual": "zoom-actual.svg",
+    "fit-to-window": "fit-to-window.svg",
+    "add": "add.svg",
+    "upscale": "upscale.svg",
+    "arrow-left": "arrow-left.svg",
+    "arrow-right": "arrow-right.svg",
 }
 
+class _IconDict:
+    """Read-only mapping of icon name to QIcon; each SVG is only loaded on first access."""
+    def __init__(self, files):
+        self._files = files
+        self._cache = {}
+
+    def __getitem__(self, key):
+        icon = self._cache.get(key)
+        if icon is None:
+            icon = QIcon(str(ICONS_DIR / self._files[key]))
+            self._cache[key] = icon
+        return icon
+
+ICONS = _IconDict(ICON_FILES)
+
 # --- Stylesheet ---
 MODERN_QSS = '''
 QWidget {
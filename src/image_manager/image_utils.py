@@ -1,13 +1,33 @@
+import functools
+import os
+import queue
+import re
 import shutil
-import uuid
-import json
+import subprocess
+import tempfile
+import threading
+import secrets
+import orjson
+import xxhash
 import time # Import time module
 from pathlib import Path
 from PIL import Image
 import numpy as np
 import onnxruntime as ort
 
-from .config import LIBRARY_DIR, THUMBNAIL_DIR, THUMBNAIL_SIZE, METADATA_FILE, INTERNAL_DATA_DIR, ROOT_DIR
+try:
+    from numba import njit, prange
+except ImportError: # Optional: post-processing falls back to plain numpy
+    njit = None
+
+from .config import LIBRARY_DIR, THUMBNAIL_DIR, THUMBNAIL_SIZE, METADATA_FILE, INTERNAL_DATA_DIR, ROOT_DIR, MODEL_CACHE_DIR
+
+# Anything other than letters, digits, underscores, spaces and hyphens
+_UNSAFE_NAME_CHARS = re.compile(r"[^\w \-]+")
+
+def sanitize_name(name):
+    """Strips characters that aren't safe in folder names (keeps Unicode letters and digits)."""
+    return _UNSAFE_NAME_CHARS.sub("", name).strip()
 
 def get_unique_filename(directory, base_name, suffix):
     """Generate a unique filename by adding a number suffix if the file already exists."""
@@ -18,90 +38,383 @@ def get_unique_filename(directory, base_name, suffix):
         counter += 1
     return file_path.name
 
+def normalize_subfolder(subfolder):
+    """Returns a subfolder in the form stored in the metadata: "/"-separated, "" for the library root."""
+    return Path(subfolder).as_posix().replace('\\', '/') if subfolder else ""
+
 def ensure_library_folders_exist():
     """Creates the necessary image and thumbnail directories if they don't exist."""
     LIBRARY_DIR.mkdir(exist_ok=True)
     INTERNAL_DATA_DIR.mkdir(exist_ok=True) # Create the internal data directory
     THUMBNAIL_DIR.mkdir(exist_ok=True)
 
-def load_metadata():
-    """Loads image metadata from the JSON file."""
+def _read_metadata_file():
+    """Reads image metadata from the JSON file."""
     if METADATA_FILE.exists():
-        with open(METADATA_FILE, 'r', encoding='utf-8') as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                print(f"Warning: {METADATA_FILE} is empty or contains invalid JSON. Returning empty metadata.")
-                return {}
+        try:
+            return orjson.loads(METADATA_FILE.read_bytes())
+        except orjson.JSONDecodeError:
+            print(f"Warning: {METADATA_FILE} is empty or contains invalid JSON. Returning empty metadata.")
+            return {}
     return {}
 
-def save_metadata(metadata):
-    """Saves image metadata to the JSON file."""
+def _write_metadata_file(data):
+    """
+    Replaces the JSON file with already serialized metadata.
+    Writes to a temporary file first so a crash mid-write can't corrupt it.
+    """
     print("Saving metadata...") # Debug print
-    with open(METADATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump(metadata, f, indent=4)
+    tmp_path = METADATA_FILE.with_name(METADATA_FILE.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, METADATA_FILE)
     print("Metadata saved.") # Debug print
 
-def process_and_copy_image(original_path, target_subfolder=""):
-    """Copies an image to the library, creates a thumbnail, and returns all relevant data."""
+def _build_subfolder_index(metadata):
+    """Groups image IDs by their posix-normalized subfolder."""
+    index = {}
+    for image_id, item_data in metadata.items():
+        # Subfolders are stored posix-normalized; the replace only matters for older entries
+        subfolder = item_data.get("subfolder", "").replace('\\', '/')
+        index.setdefault(subfolder, []).append(image_id)
+    return index
+
+def _build_hash_index(metadata):
+    """Maps content hashes to the ID of an image with that content."""
+    return {item_data["content_hash"]: image_id
+            for image_id, item_data in metadata.items() if "content_hash" in item_data}
+
+class MetadataStore:
+    """
+    In-memory copy of the image metadata.
+
+    The JSON file is read once on first access. Changes stay in memory until
+    flush() writes them back, so batch operations only pay for one write.
+    flush() only serializes the data; a background thread writes it to disk.
+    """
+    def __init__(self):
+        self._data = None
+        self._dirty = False
+        self._subfolder_index = None
+        self._hash_index = None
+        self._write_queue = queue.Queue() # Serialized snapshots waiting to be written
+        self._writer = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = _read_metadata_file()
+        return self._data
+
+    def subfolder_index(self):
+        """Returns a {subfolder: [image_id, ...]} index, rebuilt only after changes."""
+        if self._subfolder_index is None:
+            self._subfolder_index = _build_subfolder_index(self.data)
+        return self._subfolder_index
+
+    def hash_index(self):
+        """Returns a {content_hash: image_id} index, rebuilt only after changes."""
+        if self._hash_index is None:
+            self._hash_index = _build_hash_index(self.data)
+        return self._hash_index
+
+    def _changed(self):
+        self._dirty = True
+        self._subfolder_index = None
+        self._hash_index = None
+
+    def add(self, image_id, entry):
+        self.data[image_id] = entry
+        self._changed()
+
+    def update(self, image_id, **fields):
+        """Updates fields of an existing entry that no index depends on (e.g. width/height)."""
+        entry = self.data.get(image_id)
+        if entry is not None:
+            entry.update(fields)
+            self._dirty = True
+
+    def remove(self, image_id):
+        """Removes an entry and returns it, or None if the ID is unknown."""
+        entry = self.data.pop(image_id, None)
+        if entry is not None:
+            self._changed()
+        return entry
+
+    def replace(self, metadata):
+        self._data = metadata
+        self._changed()
+
+    def upsert(self, image_id, entry):
+        """Adds or replaces an entry and schedules a write."""
+        self.add(image_id, entry)
+        self.flush()
+
+    def flush(self, wait=False):
+        """
+        Schedules pending changes to be written to disk.
+        With wait=True, also blocks until every scheduled write has finished.
+        """
+        if self._dirty:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="metadata-writer", daemon=True)
+                self._writer.start()
+            # Serialize here so the writer gets a consistent snapshot of the data
+            self._write_queue.put(orjson.dumps(self._data, option=orjson.OPT_INDENT_2))
+            self._dirty = False
+        if wait:
+            self._write_queue.join()
+
+    def close(self):
+        """Writes pending changes and waits for them to reach the disk (call before exiting)."""
+        self.flush(wait=True)
+
+    def _write_loop(self):
+        while True:
+            data = self._write_queue.get()
+            pending = 1
+            # Only the newest snapshot matters; skip any that queued up behind it
+            while True:
+                try:
+                    data = self._write_queue.get_nowait()
+                except queue.Empty:
+                    break
+                pending += 1
+            try:
+                _write_metadata_file(data)
+            except OSError as e:
+                print(f"Warning: Could not save metadata: {e}")
+            finally:
+                for _ in range(pending):
+                    self._write_queue.task_done()
+
+metadata_store = MetadataStore()
+
+def load_metadata():
+    """Returns the shared image metadata dictionary, reading the JSON file on first use."""
+    return metadata_store.data
+
+def save_metadata(metadata):
+    """Saves image metadata to the JSON file."""
+    metadata_store.replace(metadata)
+    metadata_store.flush()
+
+def _fast_copy(src, dst):
+    """
+    Copies src to dst and its metadata, like shutil.copy2.
+
+    Uses os.copy_file_range where available so the kernel copies the data
+    (or reflinks it on copy-on-write filesystems), falling back to shutil.copyfile.
+    """
+    copied = False
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    written = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if written == 0:
+                        break
+                    remaining -= written
+            copied = remaining == 0
+        except OSError:
+            pass # Unsupported filesystem or cross-device copy on older kernels
+
+    if not copied:
+        shutil.copyfile(src, dst)
+    shutil.copystat(src, dst)
+
+def _hash_file(path):
+    """Returns the xxh3-64 hex digest of a file's content, read in 1 MiB chunks."""
+    hasher = xxhash.xxh3_64()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1024 * 1024):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def _link_or_copy(src, dst):
+    """Hard-links src to dst, copying instead where links aren't supported (e.g. across filesystems)."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        _fast_copy(src, dst)
+
+def _copy_to_library(original_path, target_subfolder="", content_hash=None):
+    """
+    Copies an image to the library and builds a stub metadata entry for it.
+
+    The thumbnail isn't created here: thumbnail_path points to where
+    generate_thumbnail() should write it. Width and height are read from the
+    image header (0 if it can't be read).
+    Returns an (image_id, metadata_entry) tuple.
+    """
     original_path = Path(original_path)
     
     # Generate a unique ID for the image
-    image_id = str(uuid.uuid4())
+    image_id = secrets.token_hex(16)
     suffix = original_path.suffix.lower()
     
     # Determine paths for the new image and thumbnail
     target_folder = LIBRARY_DIR / target_subfolder
     target_folder.mkdir(parents=True, exist_ok=True) # Ensure subfolder exists
 
-    library_file_name = f"{image_id}{suffix}"
-    thumbnail_file_name = f"{image_id}{suffix}"
-
-    library_path = target_folder / library_file_name
-    thumbnail_path = THUMBNAIL_DIR / thumbnail_file_name
+    # Random 128-bit names can't collide, so no need to probe for existing files
+    library_path = target_folder / f"{image_id}{suffix}"
+    thumbnail_path = THUMBNAIL_DIR / f"{image_id}.webp" # Thumbnails are always WebP
 
-    # Ensure unique file names
-    library_file_name = get_unique_filename(target_folder, image_id, suffix)
-    thumbnail_file_name = get_unique_filename(THUMBNAIL_DIR, image_id, suffix)
+    _fast_copy(original_path, library_path)
+    size_bytes = library_path.stat().st_size
+    width, height = _read_image_size(library_path)
 
-    library_path = target_folder / library_file_name
-    thumbnail_path = THUMBNAIL_DIR / thumbnail_file_name
+    entry = {
+        "original_filename": original_path.name,
+        "library_path": str(library_path),
+        "thumbnail_path": str(thumbnail_path),
+        "width": width, # Also set again once the thumbnail has been generated
+        "height": height,
+        "size_bytes": size_bytes,
+        "size_mb": size_bytes / 1048576.0, # Precomputed for the details pane
+        "subfolder": normalize_subfolder(target_subfolder), # Store the subfolder information
+        "timestamp": time.time(), # Add timestamp
+        "content_hash": content_hash or _hash_file(library_path)
+    }
+    return image_id, entry
 
-    # 1. Copy file to library
-    shutil.copy2(original_path, library_path)
+def _read_image_size(path):
+    """Returns an image's (width, height) from its header without decoding it, or (0, 0)."""
+    try:
+        with Image.open(path) as img:
+            return img.size
+    except OSError:
+        return 0, 0
 
-    # 2. Create thumbnail and get metadata
-    width, height = 0, 0
+def generate_thumbnail(library_path, thumbnail_path):
+    """
+    Writes the thumbnail for a library image and returns its (width, height).
+    Safe to call from a worker thread; it doesn't touch the metadata.
+    """
+    with Image.open(library_path) as img:
+        width, height = img.size # Read from the header, before draft() shrinks it
+        # Let libjpeg decode JPEGs at a reduced scale; no-op for other formats
+        img.draft("RGB", (THUMBNAIL_SIZE[0] * 2, THUMBNAIL_SIZE[1] * 2))
+        img.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+        img.save(thumbnail_path, format="WEBP", quality=80, method=4)
+    return width, height
+
+def image_cache_key(image_path):
+    """Cache key that changes when the file at image_path is replaced."""
     try:
-        with Image.open(library_path) as img:
-            width, height = img.size
-            img.thumbnail(THUMBNAIL_SIZE)
-            img.save(thumbnail_path)
-            print(f"Thumbnail saved to: {thumbnail_path}") # Debug print
-    except Exception as e:
-        print(f"Warning: Could not process image {original_path.name}: {e}")
-        # If image processing fails, still record basic metadata
-        pass
+        return image_path, os.stat(image_path).st_mtime_ns
+    except OSError:
+        return image_path, None
 
-    # 3. Update metadata
-    metadata = load_metadata()
-    metadata[image_id] = {
-        "original_filename": original_path.name,
+def needs_thumbnail(item_data):
+    """Returns True if an entry's thumbnail hasn't been generated yet."""
+    return not Path(item_data["thumbnail_path"]).exists()
+
+def _link_duplicate(original_path, target_subfolder, existing_entry, content_hash):
+    """
+    Adds an image whose content is already in the library by hard-linking the
+    existing library file and thumbnail instead of copying and re-encoding.
+    Returns an (image_id, metadata_entry) tuple, or None if the existing file is gone.
+    """
+    existing_library_path = Path(existing_entry["library_path"])
+    existing_thumbnail_path = Path(existing_entry["thumbnail_path"])
+    if not existing_library_path.exists():
+        return None
+
+    image_id = secrets.token_hex(16)
+    target_folder = LIBRARY_DIR / target_subfolder
+    target_folder.mkdir(parents=True, exist_ok=True) # Ensure subfolder exists
+
+    library_path = target_folder / f"{image_id}{existing_library_path.suffix}"
+    thumbnail_path = THUMBNAIL_DIR / f"{image_id}{existing_thumbnail_path.suffix}"
+    _link_or_copy(existing_library_path, library_path)
+    if existing_thumbnail_path.exists():
+        _link_or_copy(existing_thumbnail_path, thumbnail_path)
+
+    entry = dict(existing_entry,
+                 original_filename=Path(original_path).name,
+                 library_path=str(library_path),
+                 thumbnail_path=str(thumbnail_path),
+                 subfolder=normalize_subfolder(target_subfolder),
+                 timestamp=time.time(),
+                 content_hash=content_hash)
+    return image_id, entry
+
+def known_content_entries():
+    """
+    Returns a {content_hash: metadata_entry} snapshot of the library for import_file().
+    Call it on the thread that owns metadata_store, then hand it to the worker.
+    """
+    data = metadata_store.data
+    return {content_hash: data[image_id] for content_hash, image_id in metadata_store.hash_index().items()}
+
+def import_file(path, target_subfolder, known_entries):
+    """
+    Hashes an image and links or copies it into the library, without touching metadata_store.
+
+    known_entries maps content hashes to existing entries (see known_content_entries());
+    the new entry is added to it, so later duplicates in the same batch are linked too.
+    Thumbnails are left to the caller: if needs_thumbnail() is True for the entry,
+    run generate_thumbnail() and update the dimensions.
+    Safe to call from a worker thread. Returns an (image_id, metadata_entry) tuple.
+    """
+    content_hash = _hash_file(path)
+    existing_entry = known_entries.get(content_hash)
+    result = _link_duplicate(path, target_subfolder, existing_entry, content_hash) if existing_entry else None
+    if result is None:
+        result = _copy_to_library(path, target_subfolder, content_hash)
+        known_entries[content_hash] = result[1]
+    return result
+
+def save_upscaled_image(upscaled_img, original_filename, target_subfolder=""):
+    """
+    Saves an upscaled image and its thumbnail next to the original image.
+
+    Only touches the filesystem so it can run on the upscale worker thread;
+    the caller adds the returned entry to metadata_store.
+    Returns an (image_id, metadata_entry) tuple.
+    """
+    image_id = secrets.token_hex(16)
+    target_folder = LIBRARY_DIR / target_subfolder
+    target_folder.mkdir(parents=True, exist_ok=True) # Ensure subfolder exists
+
+    # Generate filename based on original image's original_filename
+    base_name = f"{Path(original_filename).stem}_upscaled"
+    upscaled_file_name = get_unique_filename(target_folder, base_name, Path(original_filename).suffix)
+    upscaled_thumbnail_name = get_unique_filename(THUMBNAIL_DIR, base_name, ".webp")
+    library_path = target_folder / upscaled_file_name
+    thumbnail_path = THUMBNAIL_DIR / upscaled_thumbnail_name
+
+    width, height = upscaled_img.size
+    upscaled_img.save(library_path)
+
+    # Create thumbnail for the upscaled image. Shrinking in place (rather than on a copy)
+    # releases the full-resolution buffer as soon as the library file is written;
+    # reducing_gap lets Pillow do most of the work with a cheap integer box reduce first.
+    upscaled_img.thumbnail(THUMBNAIL_SIZE, Image.Resampling.BILINEAR, reducing_gap=2.0)
+    upscaled_img.save(thumbnail_path, format="WEBP", quality=80, method=4)
+    upscaled_img.close()
+    size_bytes = library_path.stat().st_size
+
+    entry = {
+        "original_filename": upscaled_file_name, # Use the actual generated filename
         "library_path": str(library_path),
         "thumbnail_path": str(thumbnail_path),
         "width": width,
         "height": height,
-        "size_bytes": library_path.stat().st_size,
-        "subfolder": target_subfolder, # Store the subfolder information
-        "timestamp": time.time() # Add timestamp
+        "size_bytes": size_bytes,
+        "size_mb": size_bytes / 1048576.0, # Precomputed for the details pane
+        "subfolder": normalize_subfolder(target_subfolder),
+        "timestamp": time.time(),
+        "content_hash": _hash_file(library_path)
     }
-    save_metadata(metadata)
-
-    # 4. Return data for UI update (optional, as UI will reload from metadata)
-    item_data = metadata[image_id]
-    item_data["image_id"] = image_id # Add image_id to the item_data dictionary
-    return item_data
+    return image_id, entry
 
+@functools.lru_cache(maxsize=None)
 def get_model_scale_factor(model_path):
     """Determine the scale factor based on the model filename."""
     model_name = Path(model_path).stem.lower()
@@ -113,22 +426,179 @@ def get_model_scale_factor(model_path):
         # Default to 4 if can't determine
         return 4
 
-def upscale_image(image_path, model_path, progress_callback=None):
+# Execution providers in order of preference; unavailable ones are skipped
+UPSCALE_PROVIDERS = ['CUDAExecutionProvider', 'DmlExecutionProvider', 'CPUExecutionProvider']
+
+def _select_providers():
+    """Returns the preferred ONNX Runtime execution providers available on this machine."""
+    available = ort.get_available_providers()
+    return [p for p in UPSCALE_PROVIDERS if p in available] or ['CPUExecutionProvider']
+
+# Precision choices offered for upscaling; "auto" picks FP16 on GPU providers and FP32 on the CPU provider.
+# INT8 changes the output visibly, so it is only used when chosen explicitly.
+UPSCALE_PRECISIONS = ("auto", "fp32", "fp16", "int8")
+_PRECISION_SUFFIXES = ("_fp16", "_int8")
+
+def _prepare_model(model_path, providers, precision="auto"):
+    """
+    Returns the path of the model variant to run with the given providers and precision.
+
+    A pre-converted sibling file (e.g. model_fp16.onnx next to model.onnx) is used
+    if present. Otherwise the FP16 or INT8 dynamically quantized copy is built and
+    cached in MODEL_CACHE_DIR; if the conversion tools are missing or conversion
+    fails, the original model is used.
+    """
+    model_path = Path(model_path)
+    if precision == "auto":
+        precision = "fp32" if providers[0] == 'CPUExecutionProvider' else "fp16"
+    if precision == "fp32":
+        return model_path
+    variant = precision
+    shipped_path = model_path.with_name(f"{model_path.stem}_{variant}.onnx")
+    if shipped_path.exists():
+        return shipped_path
+    converted_path = MODEL_CACHE_DIR / f"{model_path.stem}_{variant}.onnx"
+    if converted_path.exists() and converted_path.stat().st_mtime >= model_path.stat().st_mtime:
+        return converted_path
+
+    try:
+        MODEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        if variant == "fp16":
+            import onnx
+            from onnxconverter_common import float16
+            model = float16.convert_float_to_float16(onnx.load(str(model_path)))
+            onnx.save(model, str(converted_path))
+        else:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantize_dynamic(str(model_path), str(converted_path), weight_type=QuantType.QInt8)
+        print(f"Created {variant} model: {converted_path}")
+        return converted_path
+    except ImportError as e:
+        print(f"Cannot build {variant} model ({e}), using {model_path.name}")
+    except Exception as e:
+        print(f"Failed to build {variant} model: {e}")
+        converted_path.unlink(missing_ok=True)
+    return model_path
+
+# Inference sessions keyed by (model_path, providers, precision); creating one re-parses and re-optimizes the model
+_SESSION_CACHE = {}
+
+def _get_session(model_path, providers, precision="auto"):
+    """Returns a cached InferenceSession for the model, creating it on first use."""
+    key = (str(model_path), tuple(providers), precision)
+    session = _SESSION_CACHE.get(key)
+    if session is None:
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        sess_options.enable_mem_pattern = True
+        session = ort.InferenceSession(str(_prepare_model(model_path, providers, precision)), sess_options=sess_options, providers=providers)
+        _SESSION_CACHE[key] = session
+    return session
+
+def _session_input_dtype(session):
+    """Returns the numpy dtype the session expects for its input tensor."""
+    return np.float16 if session.get_inputs()[0].type == 'tensor(float16)' else np.float32
+
+def _image_to_tensor(img_array, dtype=np.float32):
+    """Converts an HxWx3 uint8 array into a normalized 1x3xHxW float tensor using a single buffer."""
+    height, width = img_array.shape[:2]
+    tensor = np.empty((1, 3, height, width), dtype=dtype)
+    tensor[0] = img_array.transpose(2, 0, 1)
+    np.multiply(tensor, 1.0 / 255.0, out=tensor)
+    return tensor
+
+def _denormalize_in_place(output):
+    """Scales a model output from [0, 1] to [0, 255] and clips it, without allocating."""
+    np.multiply(output, 255.0, out=output)
+    np.clip(output, 0, 255, out=output)
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _quantize_kernel(chw, hwc):
+        """Scales, clips, casts and transposes a 3xHxW float image into HxWx3 uint8 in one pass."""
+        height, width = chw.shape[1], chw.shape[2]
+        for y in prange(height):
+            for x in range(width):
+                for c in range(3):
+                    hwc[y, x, c] = min(max(chw[c, y, x] * 255.0, 0.0), 255.0) # Truncated like astype()
+
+def _quantize_into(chw, hwc):
+    """
+    Writes a 3xHxW model output (values in [0, 1]) into an HxWx3 uint8 array.
+    Uses the fused Numba kernel when available; otherwise scales chw in place and copies.
+    """
+    if njit is not None and chw.dtype == np.float32:
+        _quantize_kernel(chw, hwc)
+    else:
+        _denormalize_in_place(chw)
+        hwc[...] = chw.transpose(1, 2, 0)
+
+def _tensor_to_image_array(output):
+    """Converts a 1x3xHxW model output into an HxWx3 uint8 array."""
+    image_array = np.empty((output.shape[2], output.shape[3], 3), dtype=np.uint8)
+    _quantize_into(output[0], image_array)
+    return image_array
+
+NCNN_UPSCALER = "realesrgan-ncnn-vulkan"
+# ONNX model stem -> model name bundled with realesrgan-ncnn-vulkan
+NCNN_MODEL_NAMES = {
+    "realesrgan-x4plus": "realesrgan-x4plus",
+    "realesrgan-x4plus_anime_6b": "realesrgan-x4plus-anime",
+}
+_NCNN_PROGRESS = re.compile(r"(\d+(?:\.\d+)?)%")
+
+def _find_ncnn_model(model_path):
+    """Returns (binary, ncnn_model_name) if realesrgan-ncnn-vulkan can run this model, else None."""
+    ncnn_model = NCNN_MODEL_NAMES.get(Path(model_path).stem.lower())
+    binary = shutil.which(NCNN_UPSCALER) if ncnn_model else None
+    return (binary, ncnn_model) if binary else None
+
+def upscale_image_ncnn(image_path, binary, ncnn_model, scale_factor, progress_callback=None):
+    """
+    Upscales with the realesrgan-ncnn-vulkan binary, which runs on any Vulkan GPU
+    (tiled, with fp16 where supported). Progress is parsed from its stderr.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = Path(tmp_dir) / "upscaled.png"
+        command = [binary, "-i", str(image_path), "-o", str(output_path), "-n", ncnn_model,
+                   "-s", str(scale_factor), "-t", "256", "-g", "0", "-f", "png"]
+        print(f"Running: {' '.join(command)}")
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        for line in process.stderr:
+            match = _NCNN_PROGRESS.search(line)
+            if match and progress_callback:
+                progress_callback(min(100, int(float(match.group(1)))))
+        if process.wait() != 0 or not output_path.exists():
+            raise RuntimeError(f"{NCNN_UPSCALER} exited with code {process.returncode}")
+        with Image.open(output_path) as upscaled_img:
+            return upscaled_img.convert("RGB") # Loads the pixels before the temp dir is removed
+
+def upscale_image(image_path, model_path, progress_callback=None, precision="auto"):
     """
     Upscale an image using ONNX RealESRGAN model.
+    Uses realesrgan-ncnn-vulkan instead when it is on PATH and ships a matching model.
     
     Args:
         image_path: Path to the input image
         model_path: Path to the ONNX model
         progress_callback: Optional progress callback function
+        precision: One of UPSCALE_PRECISIONS
     
     Returns:
         PIL Image or None if failed
     """
+    # ncnn picks fp16 itself on GPUs that support it, so only use it when no other precision was asked for
+    ncnn = _find_ncnn_model(model_path) if precision in ("auto", "fp16") else None
+    if ncnn is not None:
+        try:
+            return upscale_image_ncnn(image_path, *ncnn, get_model_scale_factor(model_path), progress_callback)
+        except Exception as e:
+            print(f"{NCNN_UPSCALER} failed, falling back to ONNX Runtime: {e}")
+
     try:
-        # Determine device - prioritize CPU to avoid memory issues
-        providers = ['CPUExecutionProvider']  # Force CPU for stability
-        print("Using CPUExecutionProvider (CPU) for stability")
+        # Determine device - GPU providers first, CPU as the fallback
+        providers = _select_providers()
+        print(f"Using execution providers: {providers}")
 
         # Determine scale factor from model name
         scale_factor = get_model_scale_factor(model_path)
@@ -139,7 +609,7 @@ def upscale_image(image_path, model_path, progress_callback=None):
             raise FileNotFoundError(f"ONNX model not found at {model_path}")
         
         try:
-            session = ort.InferenceSession(str(model_path), providers=providers)
+            session = _get_session(model_path, providers, precision)
         except Exception as e:
             print(f"Failed to load ONNX model: {e}")
             return None
@@ -204,10 +674,8 @@ def upscale_image_direct(img, session, input_name, output_name, scale_factor, pr
         if progress_callback:
             progress_callback(20)
 
-        # Convert to numpy array and normalize
-        img_np = np.array(img).astype(np.float32) / 255.0
-        img_np = np.transpose(img_np, (2, 0, 1))  # HWC to CHW
-        img_np = np.expand_dims(img_np, axis=0)  # Add batch dimension
+        # Convert to a normalized NCHW tensor
+        img_np = _image_to_tensor(np.asarray(img), _session_input_dtype(session))
         
         print(f"Input tensor shape: {img_np.shape}")
         
@@ -225,28 +693,9 @@ def upscale_image_direct(img, session, input_name, output_name, scale_factor, pr
         if progress_callback:
             progress_callback(80)
 
-        # Post-process output
-        output = np.squeeze(output, axis=0)  # Remove batch dimension
-        output = np.transpose(output, (1, 2, 0))  # CHW to HWC
-        
-        # Process in chunks to avoid memory issues
-        try:
-            output = np.clip(output * 255.0, 0, 255).astype(np.uint8)
-        except Exception as e:
-            print(f"Memory error during post-processing: {e}")
-            print("Trying chunk-wise processing...")
-            # Process in horizontal chunks
-            chunk_size = 500  # Smaller chunks for better memory management
-            processed_chunks = []
-            try:
-                for i in range(0, output.shape[0], chunk_size):
-                    chunk = output[i:i+chunk_size]
-                    chunk = np.clip(chunk * 255.0, 0, 255).astype(np.uint8)
-                    processed_chunks.append(chunk)
-                output = np.concatenate(processed_chunks, axis=0)
-            except Exception as chunk_error:
-                print(f"Chunk processing also failed: {chunk_error}")
-                return None
+        # Post-process output in place; only the final uint8 image is a new allocation
+        del img_np
+        output = _tensor_to_image_array(output)
         
         upscaled_img = Image.fromarray(output)
         print(f"Upscaled image dimensions: {upscaled_img.size}")
@@ -273,9 +722,17 @@ def upscale_image_direct(img, session, input_name, output_name, scale_factor, pr
         return None
 
 def upscale_image_tiled(img, session, input_name, output_name, scale_factor, progress_callback=None):
-    """Upscale image using tiling to reduce memory usage"""
+    """
+    Upscale image using tiling to reduce memory usage.
+
+    Tiles go through a three-stage pipeline: a producer thread crops and
+    normalizes tiles, the calling thread runs inference, and a writer thread
+    converts and pastes the results. ONNX Runtime releases the GIL while it
+    runs, so the numpy work of neighbouring tiles overlaps with inference.
+    """
     try:
         original_width, original_height = img.size
+        input_dtype = _session_input_dtype(session)
         tile_size = 512  # Process in 512x512 tiles
         overlap = 64     # Overlap between tiles to avoid seams
         
@@ -288,55 +745,67 @@ def upscale_image_tiled(img, session, input_name, output_name, scale_factor, pro
         
         print(f"Processing {total_tiles} tiles ({tiles_x}x{tiles_y})")
         
-        # Create output image
+        # Create output buffer; tiles are written straight into it and it becomes
+        # a PIL image only once at the end. Zeroed so failed tiles stay black.
         output_width = original_width * scale_factor
         output_height = original_height * scale_factor
-        output_img = Image.new('RGB', (output_width, output_height))
-        
-        tile_count = 0
-        
-        for y in range(tiles_y):
-            for x in range(tiles_x):
-                # Calculate tile boundaries
-                x_start = x * tile_size
-                y_start = y * tile_size
-                x_end = min(x_start + tile_size, original_width)
-                y_end = min(y_start + tile_size, original_height)
-                
-                # Extract tile with overlap
-                tile_x_start = max(0, x_start - overlap)
-                tile_y_start = max(0, y_start - overlap)
-                tile_x_end = min(original_width, x_end + overlap)
-                tile_y_end = min(original_height, y_end + overlap)
-                
-                tile = img.crop((tile_x_start, tile_y_start, tile_x_end, tile_y_end))
-                
-                # Pad tile if necessary
-                tile_width, tile_height = tile.size
-                pad_width = (scale_factor - (tile_width % scale_factor)) % scale_factor
-                pad_height = (scale_factor - (tile_height % scale_factor)) % scale_factor
-                
-                if pad_width > 0 or pad_height > 0:
-                    padded_tile = Image.new('RGB', (tile_width + pad_width, tile_height + pad_height), (0, 0, 0))
-                    padded_tile.paste(tile, (0, 0))
-                    tile = padded_tile
-                
-                # Process tile
-                tile_np = np.array(tile).astype(np.float32) / 255.0
-                tile_np = np.transpose(tile_np, (2, 0, 1))
-                tile_np = np.expand_dims(tile_np, axis=0)
-                
+        output_array = np.zeros((output_height, output_width, 3), dtype=np.uint8)
+
+        # Convert the source once; tiles are sliced out of this array
+        img_array = np.asarray(img)
+
+        # Bounded queues keep at most a couple of tiles in flight per stage
+        tile_queue = queue.Queue(maxsize=2)
+        result_queue = queue.Queue(maxsize=2)
+        stop_event = threading.Event()
+
+        def produce_tiles():
+            try:
+                for y in range(tiles_y):
+                    for x in range(tiles_x):
+                        if stop_event.is_set():
+                            return
+
+                        # Calculate tile boundaries
+                        x_start = x * tile_size
+                        y_start = y * tile_size
+                        x_end = min(x_start + tile_size, original_width)
+                        y_end = min(y_start + tile_size, original_height)
+                        
+                        # Extract tile with overlap
+                        tile_x_start = max(0, x_start - overlap)
+                        tile_y_start = max(0, y_start - overlap)
+                        tile_x_end = min(original_width, x_end + overlap)
+                        tile_y_end = min(original_height, y_end + overlap)
+                        
+                        # A view into the source pixels; nothing is copied yet
+                        tile = img_array[tile_y_start:tile_y_end, tile_x_start:tile_x_end]
+                        
+                        # Pad tile if necessary
+                        tile_height, tile_width = tile.shape[:2]
+                        pad_width = (scale_factor - (tile_width % scale_factor)) % scale_factor
+                        pad_height = (scale_factor - (tile_height % scale_factor)) % scale_factor
+                        
+                        if pad_width > 0 or pad_height > 0:
+                            tile = np.pad(tile, ((0, pad_height), (0, pad_width), (0, 0)))
+                        
+                        tile_np = _image_to_tensor(tile, input_dtype)
+                        bounds = (x_start, y_start, x_end, y_end, tile_x_start, tile_y_start)
+                        tile_queue.put((bounds, tile_np))
+            except Exception as e:
+                print(f"Error preparing tiles: {e}")
+            finally:
+                tile_queue.put(None)
+
+        def write_tiles():
+            while True:
+                item = result_queue.get()
+                if item is None:
+                    return
+                bounds, tile_output = item
+                x_start, y_start, x_end, y_end, tile_x_start, tile_y_start = bounds
                 try:
-                    tile_output = session.run([output_name], {input_name: tile_np})[0]
-                    
-                    # Post-process tile
-                    tile_output = np.squeeze(tile_output, axis=0)
-                    tile_output = np.transpose(tile_output, (1, 2, 0))
-                    tile_output = np.clip(tile_output * 255.0, 0, 255).astype(np.uint8)
-                    
-                    upscaled_tile = Image.fromarray(tile_output)
-                    
-                    # Calculate where to paste in output image
+                    # Calculate where to place the tile in the output
                     output_x_start = x_start * scale_factor
                     output_y_start = y_start * scale_factor
                     output_x_end = x_end * scale_factor
@@ -348,14 +817,30 @@ def upscale_image_tiled(img, session, input_name, output_name, scale_factor, pro
                     crop_x_end = crop_x_start + (output_x_end - output_x_start)
                     crop_y_end = crop_y_start + (output_y_end - output_y_start)
                     
-                    cropped_tile = upscaled_tile.crop((crop_x_start, crop_y_start, crop_x_end, crop_y_end))
-                    
-                    # Paste into output image
-                    output_img.paste(cropped_tile, (output_x_start, output_y_start))
-                    
+                    # Post-process only the kept region and copy it from CHW into the HWC output
+                    cropped_tile = tile_output[0, :, crop_y_start:crop_y_end, crop_x_start:crop_x_end]
+                    _quantize_into(cropped_tile, output_array[output_y_start:output_y_end, output_x_start:output_x_end])
+                except Exception as e:
+                    print(f"Error pasting tile at ({x_start}, {y_start}): {e}")
+
+        producer = threading.Thread(target=produce_tiles, daemon=True)
+        writer = threading.Thread(target=write_tiles, daemon=True)
+        producer.start()
+        writer.start()
+
+        tile_count = 0
+        try:
+            while True:
+                item = tile_queue.get()
+                if item is None:
+                    break
+                bounds, tile_np = item
+                
+                try:
+                    tile_output = session.run([output_name], {input_name: tile_np})[0]
+                    result_queue.put((bounds, tile_output))
                 except Exception as e:
                     print(f"Error processing tile {tile_count}: {e}")
-                    continue
                 
                 tile_count += 1
                 
@@ -363,10 +848,21 @@ def upscale_image_tiled(img, session, input_name, output_name, scale_factor, pro
                 if progress_callback:
                     progress = int(20 + (tile_count / total_tiles) * 80)
                     progress_callback(progress)
+        finally:
+            # Unblock the producer if we stopped early, then let the writer drain
+            stop_event.set()
+            while producer.is_alive():
+                try:
+                    tile_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            result_queue.put(None)
+            writer.join()
         
         if progress_callback:
             progress_callback(100)
         
+        output_img = Image.fromarray(output_array)
         print(f"Tiled upscaling completed. Final size: {output_img.size}")
         return output_img
         
@@ -382,52 +878,55 @@ def get_image_metadata_for_folder(folder_name="", recursive=False):
     If recursive is True, includes images from subfolders.
     """
     all_metadata = load_metadata()
-    filtered_metadata = {}
 
-    if folder_name == "": # "All" category
-        if recursive:
-            return all_metadata # Return all metadata if recursive is true for "All"
-        else: # Non-recursive "All" (should not happen with current logic, but for completeness)
-            for image_id, item_data in all_metadata.items():
-                item_subfolder = item_data.get("subfolder", "")
-                if '/' not in item_subfolder and '\\' not in item_subfolder: # Only top-level images
-                    filtered_metadata[image_id] = item_data
-            return filtered_metadata
+    if folder_name == "" and recursive: # "All" category
+        return all_metadata # Return all metadata if recursive is true for "All"
+
+    index = metadata_store.subfolder_index()
+    if folder_name == "": # Non-recursive "All" (should not happen with current logic, but for completeness)
+        subfolders = [sf for sf in index if '/' not in sf and '\\' not in sf] # Only top-level images
     else: # Specific folder
         target_folder_path = Path(folder_name).as_posix()
-        for image_id, item_data in all_metadata.items():
-            item_subfolder = Path(item_data.get("subfolder", "")).as_posix()
-            if recursive:
-                if item_subfolder == target_folder_path or item_subfolder.startswith(f"{target_folder_path}/"):
-                    filtered_metadata[image_id] = item_data
-            else:
-                if item_subfolder == target_folder_path:
-                    filtered_metadata[image_id] = item_data
-        return filtered_metadata
+        if recursive:
+            prefix = f"{target_folder_path}/"
+            subfolders = [sf for sf in index if sf == target_folder_path or sf.startswith(prefix)]
+        else:
+            subfolders = [target_folder_path] if target_folder_path in index else []
+
+    return {image_id: all_metadata[image_id] for sf in subfolders for image_id in index[sf]}
 
 def get_available_upscale_models():
     """
     Lists available ONNX upscale models in the 'models' directory.
+    Pre-converted *_fp16/*_int8 variants aren't listed separately; they are
+    picked up through the precision setting.
     Returns a list of (model_name, file_path) tuples.
     """
     models_dir = ROOT_DIR / "models"
     available_models = []
     if models_dir.exists() and models_dir.is_dir():
         for file in models_dir.iterdir():
-            if file.suffix == ".onnx":
+            if file.suffix == ".onnx" and not file.stem.lower().endswith(_PRECISION_SUFFIXES):
                 available_models.append((file.stem, str(file)))
     return available_models
 
-def remove_image_files(image_id):
-
-    """Deletes the main image and its thumbnail file from the library and removes metadata."""
-    metadata = load_metadata()
-    if image_id in metadata:
-        item_data = metadata[image_id]
+def remove_image_files_bulk(image_ids):
+    """
+    Deletes several images and their thumbnails from the library and removes their metadata.
+    The metadata file is written once for the whole batch. Returns the number of images removed.
+    """
+    removed_count = 0
+    for image_id in image_ids:
+        item_data = metadata_store.remove(image_id)
+        if item_data is None:
+            print(f"Warning: Image ID {image_id} not found in metadata.")
+            continue
         Path(item_data["library_path"]).unlink(missing_ok=True)
         Path(item_data["thumbnail_path"]).unlink(missing_ok=True)
-        del metadata[image_id]
-        save_metadata(metadata)
-    else:
-        print(f"Warning: Image ID {image_id} not found in metadata.")
+        removed_count += 1
+    metadata_store.flush()
+    return removed_count
 
+def remove_image_files(image_id):
+    """Deletes the main image and its thumbnail file from the library and removes metadata."""
+    remove_image_files_bulk([image_id])
@@ -1,57 +1,78 @@
-from PySide6.QtCore import Qt, QUrl
-from PySide6.QtGui import QAction, QDragEnterEvent, QDropEvent, QPixmap
-from PySide6.QtWidgets import QMainWindow, QWidget, QHBoxLayout, QVBoxLayout, QLabel, QMessageBox, QStatusBar, QFileDialog, QSplitter, QInputDialog, QComboBox, QLineEdit, QProgressBar # Added QProgressBar
+from PySide6.QtCore import Qt, QThread, Signal, QFileSystemWatcher, QTimer
+from PySide6.QtGui import QAction, QDragEnterEvent, QDropEvent
+from PySide6.QtWidgets import QMainWindow, QWidget, QHBoxLayout, QVBoxLayout, QLabel, QMessageBox, QStatusBar, QFileDialog, QInputDialog, QComboBox, QProgressBar # Added QProgressBar
 
-import uuid # Added for upscale_image_dialog
-import time # Added for upscale_image_dialog
+import os
 from pathlib import Path # Added for path operations
 
 from .widgets.folder_selection_dialog import FolderSelectionDialog
 
-from .config import LIBRARY_DIR, THUMBNAIL_SIZE, THUMBNAIL_DIR # Import LIBRARY_DIR, THUMBNAIL_SIZE, THUMBNAIL_DIR
-from .config import ICONS
+from .config import LIBRARY_DIR, IMAGE_EXTENSIONS, ICONS
 from .widgets.image_viewer import ImageViewer
 from .widgets.thumbnail_gallery import ThumbnailGallery
 from . import image_utils # Added for upscale functionality
 
-from PySide6.QtCore import QThread, Signal # Import QThread and Signal
+def _is_image_url(url):
+    return url.isLocalFile() and os.path.splitext(url.toLocalFile())[1].lower() in IMAGE_EXTENSIONS
 
 class UpscaleThread(QThread):
-    finished = Signal(object, str) # Signal to emit when upscaling is done (upscaled_pil_image, original_path_str)
+    finished = Signal(dict) # Signal to emit when upscaling is done (item_data of the saved upscaled image)
     error = Signal(str) # Signal to emit on error
     progress = Signal(str) # Signal to emit progress messages
     upscale_progress = Signal(int) # New signal for progress bar (0-100)
 
-    def __init__(self, image_path, model_path, parent=None):
+    def __init__(self, image_data, model_path, precision="auto", parent=None):
         super().__init__(parent)
-        self.image_path = image_path
+        self.image_data = image_data
         self.model_path = model_path
+        self.precision = precision
+        self.last_progress = -1
+
+    def report_progress(self, percent):
+        # Tiles finish quickly on a GPU; only wake the GUI thread every 2%
+        if percent - self.last_progress >= 2 or (percent >= 100 > self.last_progress):
+            self.last_progress = percent
+            self.upscale_progress.emit(percent)
 
     def run(self):
         try:
             self.progress.emit("Upscaling image... This may take a while.")
+            image_path = self.image_data["library_path"]
             # Scale factor will be auto-detected from model name
             upscaled_pil_image = image_utils.upscale_image(
-                self.image_path, 
+                image_path, 
                 self.model_path, 
-                progress_callback=self.upscale_progress.emit
+                progress_callback=self.report_progress,
+                precision=self.precision
             )
-            if upscaled_pil_image:
-                self.finished.emit(upscaled_pil_image, self.image_path)
-            else:
+            if not upscaled_pil_image:
                 self.error.emit("Upscaling failed.")
+                return
+
+            # Encode and save here so the GUI thread only has to record the result
+            self.progress.emit("Saving upscaled image...")
+            image_id, entry = image_utils.save_upscaled_image(
+                upscaled_pil_image,
+                self.image_data.get("original_filename", Path(image_path).name),
+                self.image_data.get("subfolder", "")
+            )
+            self.finished.emit(dict(entry, image_id=image_id))
         except Exception as e:
             self.error.emit(f"An error occurred during upscaling: {e}")
 
 class MainWindow(QMainWindow):
+    DETAILS_TEMPLATE = "Name: {0}\nPath: {1}\nSize: {2:.2f} MB\nDimensions: {3}x{4}"
+
     def __init__(self):
         super().__init__()
+        self.last_details = None # Fields currently shown in the details label
         self.setWindowTitle("Image Manager")
         self.resize(1400, 900)
         self.setAcceptDrops(True)
 
         self.setup_ui()
         self.setup_connections()
+        self.setup_library_watcher()
         self.load_thumbnails()
         self.load_upscale_models() # Load upscale models on startup
 
@@ -97,6 +118,7 @@ class MainWindow(QMainWindow):
 
         self.image_details_label = QLabel("Image details will be shown here.")
         self.image_details_label.setAlignment(Qt.AlignTop | Qt.AlignLeft)
+        self.image_details_label.setTextFormat(Qt.PlainText) # Skip the rich-text layout engine on every selection
         self.image_details_label.setWordWrap(True)
         right_panel_layout.addWidget(self.image_details_label)
         
@@ -114,6 +136,12 @@ class MainWindow(QMainWindow):
         self.upscale_model_combo.setToolTip("Select RealESRGAN model (scale factor auto-detected)")
         toolbar.addWidget(self.upscale_model_combo)
 
+        self.upscale_precision_combo = QComboBox(self)
+        self.upscale_precision_combo.setToolTip("Inference precision (Auto: FP16 on GPU, FP32 on CPU)")
+        for precision in image_utils.UPSCALE_PRECISIONS:
+            self.upscale_precision_combo.addItem(precision.upper() if precision != "auto" else "Auto", precision)
+        toolbar.addWidget(self.upscale_precision_combo)
+
         self.upscale_action = QAction(ICONS["upscale"], "Upscale Image", self) # New action for upscale
         toolbar.addAction(self.upscale_action)
         toolbar.addSeparator()
@@ -138,12 +166,29 @@ class MainWindow(QMainWindow):
         self.status_bar.addPermanentWidget(self.progress_bar)
         self.setStatusBar(self.status_bar)
 
+        # Arrow-key auto-repeat only moves the highlight; the image loads once the keys settle
+        self.nav_target_index = None
+        self.nav_debounce_timer = QTimer(self)
+        self.nav_debounce_timer.setSingleShot(True)
+        self.nav_debounce_timer.setInterval(80)
+        self.nav_debounce_timer.timeout.connect(self.apply_navigation_target)
+
+        # Hides the progress bar and file label a moment after an upscale error
+        self.hide_upscale_status_timer = QTimer(self)
+        self.hide_upscale_status_timer.setSingleShot(True)
+        self.hide_upscale_status_timer.timeout.connect(self.hide_upscale_status)
+
+    def hide_upscale_status(self):
+        self.progress_bar.hide()
+        self.upscale_file_label.hide()
+
     def setup_connections(self):
         self.import_action.triggered.connect(self.import_images_dialog)
         self.import_folder_action.triggered.connect(self.import_folder_dialog)
         self.thumbnail_gallery.image_selected.connect(self.on_image_selected)
         self.thumbnail_gallery.status_message.connect(self.status_bar.showMessage)
         self.thumbnail_gallery.library_updated.connect(self.update_status_bar)
+        self.thumbnail_gallery.image_data_changed.connect(self.on_image_data_changed)
 
         # Connect ImageViewer actions
         self.image_viewer.zoom_in_action.triggered.connect(self.image_viewer.zoom_in)
@@ -158,6 +203,22 @@ class MainWindow(QMainWindow):
         self.new_category_action.triggered.connect(self.create_new_category_dialog) # Connect new action
         self.upscale_action.triggered.connect(self.upscale_image_dialog) # Connect upscale action
 
+    def setup_library_watcher(self):
+        """Refreshes the category buttons when folders are added to or removed from the library."""
+        self.library_watcher = QFileSystemWatcher([str(LIBRARY_DIR)], self)
+        # Moves and bulk copies arrive as bursts of events; refresh once they settle
+        self.library_refresh_timer = QTimer(self)
+        self.library_refresh_timer.setSingleShot(True)
+        self.library_refresh_timer.setInterval(300)
+        self.library_refresh_timer.timeout.connect(self.on_library_changed)
+        self.library_watcher.directoryChanged.connect(self.library_refresh_timer.start)
+
+    def on_library_changed(self):
+        self.thumbnail_gallery.refresh_categories()
+        current_folder = self.thumbnail_gallery.current_folder
+        if current_folder and not (LIBRARY_DIR / current_folder).is_dir():
+            self.thumbnail_gallery.filter_by_category_button("") # The viewed folder was removed or renamed outside the app
+
     def on_image_selected(self, image_data):
         # Reset progress bar and file label when selecting a new image
         self.progress_bar.setValue(0)
@@ -167,19 +228,30 @@ class MainWindow(QMainWindow):
         
         if image_data:
             self.image_viewer.set_image(image_data["library_path"], image_data)
-            details = (
-                f"<b>Name:</b> {image_data['original_filename']}<br>"
-                f"<b>Path:</b> {image_data['library_path']}<br>"
-                f"<b>Size:</b> {image_data['size_bytes'] / (1024 * 1024):.2f} MB<br>"
-                f"<b>Dimensions:</b> {image_data['width']}x{image_data['height']}"
-            )
-            self.image_details_label.setText(details)
+            self.show_image_details(image_data)
             # 更新导航按钮状态
             self.update_navigation_buttons_state()
+            self.prefetch_neighbouring_images()
         else:
             self.image_viewer.clear_image()
+            self.last_details = None
             self.image_details_label.setText("Image details will be shown here.")
 
+    def show_image_details(self, image_data):
+        details = (image_data['original_filename'], image_data['library_path'],
+                   image_data.get('size_mb') or image_data['size_bytes'] * (1.0 / 1048576.0), # Older entries lack size_mb
+                   image_data['width'], image_data['height'])
+        if details != self.last_details: # Avoid re-laying out the label on reselection
+            self.last_details = details
+            self.image_details_label.setText(self.DETAILS_TEMPLATE.format(*details))
+
+    def on_image_data_changed(self, image_data):
+        # Imported images get their real dimensions once the thumbnail worker reports them
+        current = self.image_viewer.image_data
+        if current and current["library_path"] == image_data["library_path"]:
+            current.update(width=image_data["width"], height=image_data["height"])
+            self.show_image_details(current)
+
     def import_images_dialog(self):
         file_paths, _ = QFileDialog.getOpenFileNames(
             self, "Select Images to Import", "", "Image Files (*.png *.jpg *.jpeg *.bmp *.gif)"
@@ -208,13 +280,13 @@ class MainWindow(QMainWindow):
 
     def dragEnterEvent(self, event: QDragEnterEvent):
         if event.mimeData().hasUrls():
-            urls = event.mimeData().urls()
-            if any(url.isLocalFile() and url.toLocalFile().lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')) for url in urls):
+            if any(map(_is_image_url, event.mimeData().urls())):
                 event.acceptProposedAction()
 
     def dropEvent(self, event: QDropEvent):
         urls = event.mimeData().urls()
-        file_paths = [url.toLocalFile() for url in urls if url.isLocalFile() and url.toLocalFile().lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif'))]
+        file_paths = [path for path in (url.toLocalFile() for url in urls if url.isLocalFile())
+                      if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS]
         if file_paths:
             # For drag and drop, import to current folder
             self.thumbnail_gallery.process_imported_paths(file_paths, self.thumbnail_gallery.current_folder)
@@ -222,8 +294,7 @@ class MainWindow(QMainWindow):
     def create_new_category_dialog(self):
         new_category_name, ok = QInputDialog.getText(self, "New Category", "Enter new category name:")
         if ok and new_category_name:
-            sanitized_name = "".join(c for c in new_category_name if c.isalnum() or c in (' ', '-', '_')).strip()
-            sanitized_name = sanitized_name.replace(" ", "_")
+            sanitized_name = image_utils.sanitize_name(new_category_name).replace(" ", "_")
             if not sanitized_name:
                 QMessageBox.warning(self, "Invalid Name", "Sanitized category name is empty. Please use valid characters.")
                 return
@@ -297,11 +368,13 @@ class MainWindow(QMainWindow):
             self.progress_bar.setValue(0)
             self.progress_bar.show()
 
-            self.upscale_thread = UpscaleThread(str(original_path), selected_model_path)
-            self.upscale_thread.finished.connect(self.on_upscale_finished)
-            self.upscale_thread.error.connect(self.on_upscale_error)
-            self.upscale_thread.progress.connect(self.status_bar.showMessage)
-            self.upscale_thread.upscale_progress.connect(self.progress_bar.setValue) # Connect progress signal
+            self.upscale_thread = UpscaleThread(dict(current_image_data), selected_model_path,
+                                                self.upscale_precision_combo.currentData())
+            # The thread emits from outside the GUI thread, so always queue these
+            self.upscale_thread.finished.connect(self.on_upscale_finished, Qt.QueuedConnection)
+            self.upscale_thread.error.connect(self.on_upscale_error, Qt.QueuedConnection)
+            self.upscale_thread.progress.connect(self.status_bar.showMessage, Qt.QueuedConnection)
+            self.upscale_thread.upscale_progress.connect(self.progress_bar.setValue, Qt.QueuedConnection) # Connect progress signal
             
             self.upscale_thread.start()
 
@@ -311,78 +384,32 @@ class MainWindow(QMainWindow):
             self.progress_bar.setValue(0) # Reset progress bar on error
             self.upscale_file_label.setText("Error")
             # Hide progress bar and label after a short delay
-            from PySide6.QtCore import QTimer
-            QTimer.singleShot(2000, lambda: (self.progress_bar.hide(), self.upscale_file_label.hide()))
+            self.hide_upscale_status_timer.start(2000)
 
-    def on_upscale_finished(self, upscaled_pil_image, original_path_str):
+    def on_upscale_finished(self, item_data):
         # Ensure progress bar reaches 100% and shows completion
         self.progress_bar.setValue(100)
-        original_path = Path(original_path_str)
-        current_image_data = self.image_viewer.image_data # Get current image data
         
         # Show completion with original filename from metadata
-        original_filename = current_image_data.get("original_filename", original_path.name)
+        original_filename = self.upscale_thread.image_data.get("original_filename", "")
         self.upscale_file_label.setText(f"Completed: {original_filename}")
         
         # Keep progress bar and label visible to show completion status
         # They will be hidden when user selects another image
 
-        if upscaled_pil_image:
-            # Generate a new unique ID for the upscaled image
-            image_id = str(uuid.uuid4())
-            suffix = original_path.suffix.lower()
-            
-            # Determine paths for the new upscaled image
-            target_subfolder = current_image_data.get("subfolder", "")
-            target_folder = LIBRARY_DIR / target_subfolder
-            target_folder.mkdir(parents=True, exist_ok=True) # Ensure subfolder exists
+        # The files are already on disk; just record the new entry
+        entry = dict(item_data)
+        image_id = entry.pop("image_id")
+        image_utils.metadata_store.upsert(image_id, entry)
 
-            # Generate filename based on original image's original_filename
-            original_filename = current_image_data.get("original_filename", original_path.name)
-            original_stem = Path(original_filename).stem
-            original_suffix = Path(original_filename).suffix
-            base_name = f"{original_stem}_upscaled"
-            upscaled_file_name = image_utils.get_unique_filename(target_folder, base_name, original_suffix)
-            upscaled_thumbnail_name = image_utils.get_unique_filename(THUMBNAIL_DIR, base_name, original_suffix)
-            
-            upscaled_library_path = target_folder / upscaled_file_name
-            upscaled_thumbnail_path = THUMBNAIL_DIR / upscaled_thumbnail_name
-
-            # Save the upscaled image
-            upscaled_pil_image.save(upscaled_library_path)
-
-            # Create thumbnail for the upscaled image
-            upscaled_pil_image.thumbnail(THUMBNAIL_SIZE)
-            upscaled_pil_image.save(upscaled_thumbnail_path)
-
-            # Update metadata
-            metadata = image_utils.load_metadata()
-            metadata[image_id] = {
-                "original_filename": upscaled_file_name,  # Use the actual generated filename
-                "library_path": str(upscaled_library_path),
-                "thumbnail_path": str(upscaled_thumbnail_path),
-                "width": upscaled_pil_image.width,
-                "height": upscaled_pil_image.height,
-                "size_bytes": upscaled_library_path.stat().st_size,
-                "subfolder": target_subfolder,
-                "timestamp": time.time()
-            }
-            image_utils.save_metadata(metadata)
-
-            self.status_bar.showMessage("Image upscaled successfully!", 5000)
-            
-            # Delay thumbnail refresh to keep completion status visible
-            from PySide6.QtCore import QTimer
-            QTimer.singleShot(3000, lambda: self.thumbnail_gallery.load_thumbnails(self.thumbnail_gallery.current_folder))
-        else:
-            self.status_bar.showMessage("Upscaling failed.", 3000)
+        self.thumbnail_gallery.add_image(image_id, entry)
+        self.status_bar.showMessage("Image upscaled successfully!", 5000) # After add_image, which reports "Library updated."
 
     def on_upscale_error(self, message):
         self.progress_bar.setValue(0) # Reset progress bar on error
         self.upscale_file_label.setText("Error")
         # Hide progress bar and label after a short delay
-        from PySide6.QtCore import QTimer
-        QTimer.singleShot(2000, lambda: (self.progress_bar.hide(), self.upscale_file_label.hide()))
+        self.hide_upscale_status_timer.start(2000)
         
         QMessageBox.critical(self, "Error", message)
         self.status_bar.showMessage("Upscaling failed.", 3000)
@@ -392,13 +419,7 @@ class MainWindow(QMainWindow):
         if not self.image_viewer.image_data:
             return -1
             
-        current_path = self.image_viewer.image_data["library_path"]
-        image_list = self.thumbnail_gallery.get_current_image_list()
-        
-        for i, image_data in enumerate(image_list):
-            if image_data["library_path"] == current_path:
-                return i
-        return -1
+        return self.thumbnail_gallery.index_of(self.image_viewer.image_data["library_path"])
         
     def navigate_to_previous_image(self):
         """导航到上一张图片"""
@@ -416,6 +437,34 @@ class MainWindow(QMainWindow):
             next_image = image_list[current_index + 1]
             self.thumbnail_gallery.select_image_by_data(next_image)
             
+    def prefetch_neighbouring_images(self):
+        """预加载前后两张图片"""
+        current_index = self.get_current_image_index()
+        if current_index == -1:
+            return
+        image_list = self.thumbnail_gallery.get_current_image_list()
+        neighbours = image_list[max(current_index - 1, 0):current_index + 2]
+        self.image_viewer.prefetch([image_data["library_path"] for image_data in neighbours if image_data is not image_list[current_index]])
+
+    def step_navigation(self, step):
+        """键盘导航：立即移动高亮，延迟加载图片"""
+        current_index = self.nav_target_index if self.nav_target_index is not None else self.get_current_image_index()
+        if current_index == -1:
+            return
+        image_list = self.thumbnail_gallery.get_current_image_list()
+        target_index = max(0, min(current_index + step, len(image_list) - 1))
+        if target_index == current_index:
+            return
+        self.nav_target_index = target_index
+        self.thumbnail_gallery.select_image_by_data(image_list[target_index], emit=False)
+        self.nav_debounce_timer.start()
+
+    def apply_navigation_target(self):
+        target_index, self.nav_target_index = self.nav_target_index, None
+        image_list = self.thumbnail_gallery.get_current_image_list()
+        if target_index is not None and target_index < len(image_list):
+            self.thumbnail_gallery.select_image_by_data(image_list[target_index])
+
     def update_navigation_buttons_state(self):
         """更新导航按钮的启用状态"""
         current_index = self.get_current_image_index()
@@ -435,9 +484,9 @@ class MainWindow(QMainWindow):
     def keyPressEvent(self, event):
         """处理键盘事件"""
         if event.key() == Qt.Key_Left:
-            self.navigate_to_previous_image()
+            self.step_navigation(-1)
         elif event.key() == Qt.Key_Right:
-            self.navigate_to_next_image()
+            self.step_navigation(1)
         elif event.key() == Qt.Key_D and event.modifiers() == Qt.ControlModifier:
             # Ctrl+D 切换导航区域调试模式
             self.image_viewer.toggle_navigation_zone_debug()
@@ -3,6 +3,8 @@ from PySide6.QtCore import Qt, Signal
 from PySide6.QtGui import QStandardItemModel, QStandardItem
 from PySide6.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton, QListView, QLabel, QMessageBox
 
+import os
+
 from .. import image_utils
 from ..config import LIBRARY_DIR
 from pathlib import Path
@@ -13,6 +15,7 @@ class FolderSelectionDialog(QDialog):
         self.setWindowTitle("Select or Create Folder")
         self.current_gallery_folder = current_gallery_folder
         self.selected_folder_path = ""
+        self.existing_folders_lower = set()
 
         self.init_ui()
         self.load_folders()
@@ -24,6 +27,9 @@ class FolderSelectionDialog(QDialog):
 
         # Existing folders list
         self.folder_list_view = QListView()
+        self.folder_list_view.setUniformItemSizes(True) # All rows are plain folder names
+        self.folder_list_view.setLayoutMode(QListView.Batched)
+        self.folder_list_view.setBatchSize(256)
         self.folder_model = QStandardItemModel(self.folder_list_view)
         self.folder_list_view.setModel(self.folder_model)
         self.folder_list_view.clicked.connect(self.on_folder_selected)
@@ -58,26 +64,29 @@ class FolderSelectionDialog(QDialog):
         root_item = QStandardItem(".")
         root_item.setData("", Qt.UserRole) # Empty string for root
         root_item.setEditable(False) # Make it non-editable
-        self.folder_model.appendRow(root_item)
 
         # Collect direct subfolders of LIBRARY_DIR
+        # scandir's DirEntry caches the file type, so is_dir() needs no extra stat
         top_level_folders = set()
-        for entry in LIBRARY_DIR.iterdir():
-            if entry.is_dir() and not entry.name.startswith("."): # Exclude hidden/internal folders
-                # Check if this folder contains any subdirectories (to enforce two-level structure)
-                has_subdirectories = False
-                for sub_entry in entry.iterdir():
-                    if sub_entry.is_dir():
-                        has_subdirectories = True
-                        break
-                if not has_subdirectories: # Only add if it does not contain subdirectories
-                    top_level_folders.add(entry.name)
-
-        for folder_name in sorted(list(top_level_folders)):
+        with os.scandir(LIBRARY_DIR) as entries:
+            for entry in entries:
+                if not entry.name.startswith(".") and entry.is_dir(follow_symlinks=False): # Exclude hidden/internal folders
+                    # Check if this folder contains any subdirectories (to enforce two-level structure)
+                    with os.scandir(entry.path) as sub_entries:
+                        has_subdirectories = any(sub_entry.is_dir() for sub_entry in sub_entries)
+                    if not has_subdirectories: # Only add if it does not contain subdirectories
+                        top_level_folders.add(entry.name)
+
+        self.existing_folders_lower = {folder_name.lower() for folder_name in top_level_folders} # For case-insensitive duplicate checks
+
+        rows = [root_item]
+        for folder_name in sorted(top_level_folders):
             item = QStandardItem(folder_name)
             item.setData(folder_name, Qt.UserRole) # Data is just the folder name
             item.setEditable(False) # Make it non-editable
-            self.folder_model.appendRow(item)
+            rows.append(item)
+        # One insertion, so the view lays out once rather than per folder
+        self.folder_model.invisibleRootItem().appendRows(rows)
 
     def on_folder_selected(self, index):
         item = self.folder_model.itemFromIndex(index)
@@ -94,8 +103,7 @@ class FolderSelectionDialog(QDialog):
             return
 
         # Sanitize new_name to create a valid path segment
-        sanitized_name = "".join(c for c in new_name if c.isalnum() or c in (' ', '-', '_')).strip()
-        sanitized_name = sanitized_name.replace(" ", "_")
+        sanitized_name = image_utils.sanitize_name(new_name).replace(" ", "_")
         if not sanitized_name:
             QMessageBox.warning(self, "Invalid Name", "Sanitized folder name is empty. Please use valid characters.")
             return
@@ -104,12 +112,12 @@ class FolderSelectionDialog(QDialog):
         full_new_folder_path = sanitized_name # This will be the subfolder name directly under LIBRARY_DIR
 
         # Check if folder already exists (case-insensitive for user experience)
-        existing_folders = [self.folder_model.item(row).text().lower() for row in range(self.folder_model.rowCount())]
-        if sanitized_name.lower() in existing_folders:
+        if sanitized_name.lower() in self.existing_folders_lower:
             QMessageBox.warning(self, "Folder Exists", f"Folder '{new_name}' already exists.")
             return
 
         # No need to create actual directory here, image_utils will handle it
+        self.existing_folders_lower.add(sanitized_name.lower())
         self.selected_folder_path = full_new_folder_path
         self.accept()
 
@@ -1,8 +1,61 @@
-from PySide6.QtCore import Qt, QSize, Signal, QPoint, QRect, QPropertyAnimation, QEasingCurve
-from PySide6.QtGui import QPixmap, QAction, QPainter, QCursor
+from PySide6.QtCore import Qt, QSize, Signal, QPoint, QRect, QRectF, QPropertyAnimation, QParallelAnimationGroup, QEasingCurve, QObject, QRunnable, QThreadPool, QTimer
+from PySide6.QtGui import QPixmap, QAction, QPainter, QCursor, QImage, QImageReader
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QLabel, QPushButton, QGraphicsOpacityEffect
 
+from collections import OrderedDict
+
 from ..config import ICONS
+from ..image_utils import image_cache_key
+
+PIXMAP_CACHE_BYTES = 256 * 1024 * 1024 # Budget for recently viewed/prefetched images
+
+# 导航按钮样式
+NAV_BUTTON_STYLE = """
+    QPushButton#navButton {
+        background-color: rgba(52, 73, 94, 200);
+        border: 2px solid rgba(149, 165, 166, 100);
+        border-radius: 25px;
+        color: #ecf0f1;
+        font-weight: bold;
+    }
+    QPushButton#navButton:hover {
+        background-color: rgba(52, 73, 94, 250);
+        border: 2px solid rgba(149, 165, 166, 200);
+    }
+    QPushButton#navButton:pressed {
+        background-color: rgba(44, 62, 80, 200);
+    }
+    QPushButton#navButton:disabled {
+        background-color: rgba(52, 73, 94, 100);
+        border: 2px solid rgba(149, 165, 166, 50);
+        color: rgba(236, 240, 241, 100);
+    }
+"""
+
+class ImageLoadSignals(QObject):
+    loaded = Signal(int, object, QImage, QSize) # generation, cache key, decoded image, full image size
+
+class ImageLoadWorker(QRunnable):
+    """Decodes an image on a QThreadPool thread, letting the decoder downscale it to target_size if given."""
+    def __init__(self, generation, cache_key, target_size=None):
+        super().__init__()
+        self.generation = generation
+        self.cache_key = cache_key
+        self.image_path = cache_key[0]
+        self.target_size = target_size
+        self.signals = ImageLoadSignals()
+
+    def run(self):
+        reader = QImageReader(self.image_path)
+        full_size = reader.size()
+        if self.target_size is not None and full_size.isValid() and \
+           (full_size.width() > self.target_size.width() or full_size.height() > self.target_size.height()):
+            # JPEG can decode straight at a reduced scale; other formats are scaled after decoding
+            reader.setScaledSize(full_size.scaled(self.target_size, Qt.KeepAspectRatio))
+        image = reader.read()
+        if not full_size.isValid():
+            full_size = image.size()
+        self.signals.loaded.emit(self.generation, self.cache_key, image, full_size)
 
 class ImageViewer(QWidget):
     # 添加导航信号
@@ -12,18 +65,36 @@ class ImageViewer(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.current_pixmap = None
+        self.image_size = QSize() # Full resolution of the current image; current_pixmap may be a smaller preview
+        self.image_path = None
+        self.displayed_path = None # Path whose (possibly preview) pixmap is currently laid out
+        self.load_generation = 0 # Bumped on every set_image so stale background loads are dropped
+        self.full_resolution_requested = False
+        self.pixmap_cache = OrderedDict() # cache key -> (pixmap, full size, is full resolution), in LRU order
+        self.pixmap_cache_bytes = 0
+        self.prefetching = set() # cache keys with a prefetch in flight
+        self.awaited_prefetch = None # cache key of the current image when it is waiting on a prefetch
+        self.prefetch_pool = QThreadPool(self) # Separate, small pool so prefetches never delay the image being viewed
+        self.prefetch_pool.setMaxThreadCount(2)
+        self.display_buffer = None # Label-sized pixmap reused for every frame
+        self.display_dirty_rect = QRectF() # Area of display_buffer painted by the last frame
         self.zoom_factor = 1.0
+        self.scaled_width = 0 # image_size * zoom_factor, updated in update_pixmap_display
+        self.scaled_height = 0
         self.min_zoom_factor = 0.1 # Minimum zoom level (10% of actual size)
         self.max_zoom_factor = 10.0 # Maximum zoom level (1000% of actual size)
         self.is_fitted_to_window = True  # Flag to control fit-to-window on resize
         self.pan_offset = QPoint(0, 0)  # Current pan offset
         self.last_mouse_pos = None  # Last position for panning
         self.is_panning = False # Add this line to initialize is_panning
+        self.pan_redraw_pending = False # A coalesced pan redraw is queued
         self.image_data = None # Initialize image_data
         self.mouse_over_image = False  # 跟踪鼠标是否在图片区域
         self.mouse_in_nav_zone = False  # 鼠标是否在任何导航区域内
         self.buttons_have_focus = False  # 按钮是否有焦点（被悬停或点击）
         self.nav_zone_width = 120  # 导航区域宽度（像素）
+        self.left_nav_rect = QRect()  # 左导航区域（含按钮），在 resizeEvent 中更新
+        self.right_nav_rect = QRect()  # 右导航区域（含按钮），在 resizeEvent 中更新
 
         self.setMouseTracking(True)  # Enable mouse tracking
         self.setCursor(Qt.OpenHandCursor) # Default cursor for panning
@@ -66,30 +137,10 @@ class ImageViewer(QWidget):
         self.next_button.clicked.connect(self.navigate_next.emit)
         
         # 设置按钮样式 - 统一样式，通过透明度控制可见性
-        nav_button_style = """
-            QPushButton {
-                background-color: rgba(52, 73, 94, 200);
-                border: 2px solid rgba(149, 165, 166, 100);
-                border-radius: 25px;
-                color: #ecf0f1;
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                background-color: rgba(52, 73, 94, 250);
-                border: 2px solid rgba(149, 165, 166, 200);
-            }
-            QPushButton:pressed {
-                background-color: rgba(44, 62, 80, 200);
-            }
-            QPushButton:disabled {
-                background-color: rgba(52, 73, 94, 100);
-                border: 2px solid rgba(149, 165, 166, 50);
-                color: rgba(236, 240, 241, 100);
-            }
-        """
-        
-        self.prev_button.setStyleSheet(nav_button_style)
-        self.next_button.setStyleSheet(nav_button_style)
+        # 样式表只在查看器上设置一次，两个按钮通过 objectName 匹配
+        self.prev_button.setObjectName("navButton")
+        self.next_button.setObjectName("navButton")
+        self.setStyleSheet(NAV_BUTTON_STYLE)
         
         # 创建透明度效果
         self.prev_opacity_effect = QGraphicsOpacityEffect()
@@ -98,7 +149,7 @@ class ImageViewer(QWidget):
         self.prev_button.setGraphicsEffect(self.prev_opacity_effect)
         self.next_button.setGraphicsEffect(self.next_opacity_effect)
         
-        # 创建透明度动画
+        # 创建透明度动画 - 两个按钮放在同一个动画组中，一起启动/停止
         self.prev_opacity_animation = QPropertyAnimation(self.prev_opacity_effect, b"opacity")
         self.prev_opacity_animation.setDuration(300)  # 300毫秒动画
         self.prev_opacity_animation.setEasingCurve(QEasingCurve.OutCubic)
@@ -107,6 +158,11 @@ class ImageViewer(QWidget):
         self.next_opacity_animation.setDuration(300)  # 300毫秒动画
         self.next_opacity_animation.setEasingCurve(QEasingCurve.OutCubic)
         
+        self.nav_fade_animation = QParallelAnimationGroup(self)
+        self.nav_fade_animation.addAnimation(self.prev_opacity_animation)
+        self.nav_fade_animation.addAnimation(self.next_opacity_animation)
+        self.nav_fade_animation.finished.connect(self.on_nav_fade_finished)
+        
         # 设置初始透明度
         self.prev_opacity_effect.setOpacity(0.0)
         self.next_opacity_effect.setOpacity(0.0)
@@ -125,24 +181,54 @@ class ImageViewer(QWidget):
         if not self.current_pixmap:
             return
 
-        scaled_pixmap = self.current_pixmap.scaled(
-            self.current_pixmap.size() * self.zoom_factor,
-            Qt.KeepAspectRatio, Qt.SmoothTransformation
-        )
-
-        # Calculate the top-left corner to draw the scaled image, considering pan_offset
-        x = (self.image_label.width() - scaled_pixmap.width()) // 2 + self.pan_offset.x()
-        y = (self.image_label.height() - scaled_pixmap.height()) // 2 + self.pan_offset.y()
-
-        # Create a blank pixmap the size of the label
-        display_pixmap = QPixmap(self.image_label.size())
-        display_pixmap.fill(Qt.transparent) # Fill with transparent background
+        # Every zoom or image change ends up here, so refresh the cached scaled size
+        self.scaled_width = int(self.image_size.width() * self.zoom_factor)
+        self.scaled_height = int(self.image_size.height() * self.zoom_factor)
+
+        target_size = self.image_size * self.zoom_factor
+        # 1px slack for rounding between the fitted zoom and the preview's scaled size
+        if not self.full_resolution_requested and \
+           (target_size.width() > self.current_pixmap.width() + 1 or target_size.height() > self.current_pixmap.height() + 1):
+            self.request_full_resolution() # Zoomed past the preview's resolution
+
+        # Position of the whole zoomed image relative to the label, considering pan_offset
+        display_width = self.image_size.width() * self.zoom_factor
+        display_height = self.image_size.height() * self.zoom_factor
+        x = (self.image_label.width() - display_width) / 2 + self.pan_offset.x()
+        y = (self.image_label.height() - display_height) / 2 + self.pan_offset.y()
+
+        # Only the part of the image that lands inside the label is scaled and drawn,
+        # so the cost depends on the label size rather than on the zoom level
+        target_rect = QRectF(x, y, display_width, display_height).intersected(QRectF(self.image_label.rect()))
+        if target_rect.isEmpty():
+            source_rect = QRectF()
+        else:
+            pixmap_scale = self.current_pixmap.width() / display_width # Pixmap pixels per display pixel
+            source_rect = QRectF((target_rect.x() - x) * pixmap_scale, (target_rect.y() - y) * pixmap_scale,
+                                 target_rect.width() * pixmap_scale, target_rect.height() * pixmap_scale)
 
-        painter = QPainter(display_pixmap)
-        painter.drawPixmap(x, y, scaled_pixmap)
+        # Let go of the label's reference first so painting reuses the buffer instead of detaching a copy
+        self.image_label.clear()
+        if self.display_buffer is None or self.display_buffer.size() != self.image_label.size():
+            # (Re)create the label-sized buffer; only happens on resize
+            self.display_buffer = QPixmap(self.image_label.size())
+            self.display_buffer.fill(Qt.transparent) # Fill with transparent background
+            self.display_dirty_rect = QRectF()
+
+        painter = QPainter(self.display_buffer)
+        # Only clear the area painted by the previous frame
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        painter.fillRect(self.display_dirty_rect, Qt.transparent)
+        painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+        # Nearest-neighbour while panning; mouseReleaseEvent redraws smoothly
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, not self.is_panning)
+        if not source_rect.isEmpty():
+            painter.drawPixmap(target_rect, self.current_pixmap, source_rect)
         painter.end()
+        # Round outwards so antialiased edge pixels are cleared next time
+        self.display_dirty_rect = QRectF(target_rect.toAlignedRect())
 
-        self.image_label.setPixmap(display_pixmap)
+        self.image_label.setPixmap(self.display_buffer)
 
     def zoom_in(self):
         new_zoom_factor = self.zoom_factor * 1.25
@@ -167,7 +253,7 @@ class ImageViewer(QWidget):
     def fit_to_window(self):
         if self.current_pixmap and self.image_label.width() > 1 and self.image_label.height() > 1:
             label_size = self.image_label.size()
-            pixmap_size = self.current_pixmap.size()
+            pixmap_size = self.image_size
 
             if pixmap_size.width() == 0 or pixmap_size.height() == 0:
                 return
@@ -181,15 +267,108 @@ class ImageViewer(QWidget):
             self.update_pixmap_display()
 
     def set_image(self, image_path, image_data):
-        self.current_pixmap = QPixmap(image_path)
         self.image_data = image_data # Store image_data
+        self.image_path = image_path
+        self.awaited_prefetch = None
+        self.displayed_path = None # Lay out the next loaded image from scratch, even if it's the same file
+        cache_key = image_cache_key(image_path)
+        cached = self.pixmap_cache.get(cache_key)
+        if cached is not None:
+            self.pixmap_cache.move_to_end(cache_key)
+            self.load_generation += 1 # Drop any load still in flight for the previous image
+            pixmap, full_size, is_full = cached
+            self.full_resolution_requested = is_full
+            self.show_loaded_pixmap(pixmap, full_size)
+            return
+        if cache_key in self.prefetching:
+            # Already being decoded by a prefetch: show that result instead of decoding twice
+            self.load_generation += 1
+            self.full_resolution_requested = False
+            self.awaited_prefetch = cache_key
+            return
+        # Decode in the background at roughly the viewer's size; the full image is only decoded when zooming in
+        self.start_image_load(cache_key, self.preview_size())
+
+    def preview_size(self):
+        label_size = self.image_label.size()
+        return label_size if label_size.width() > 1 and label_size.height() > 1 else None
+
+    def start_image_load(self, cache_key, target_size=None):
+        self.load_generation += 1
+        self.full_resolution_requested = target_size is None
+        worker = ImageLoadWorker(self.load_generation, cache_key, target_size)
+        worker.signals.loaded.connect(self.on_image_loaded)
+        QThreadPool.globalInstance().start(worker)
+
+    def request_full_resolution(self):
+        self.full_resolution_requested = True
+        if self.image_path:
+            self.start_image_load(image_cache_key(self.image_path))
+
+    def prefetch(self, image_paths):
+        """Decodes images the user is likely to view next into the pixmap cache."""
+        target_size = self.preview_size()
+        for image_path in image_paths:
+            cache_key = image_cache_key(image_path)
+            if cache_key in self.pixmap_cache or cache_key in self.prefetching:
+                continue
+            self.prefetching.add(cache_key)
+            worker = ImageLoadWorker(-1, cache_key, target_size) # -1: never displayed directly
+            worker.signals.loaded.connect(self.on_image_loaded)
+            self.prefetch_pool.start(worker)
+
+    def cache_pixmap(self, cache_key, pixmap, full_size, is_full):
+        previous = self.pixmap_cache.pop(cache_key, None)
+        if previous is not None:
+            if previous[2] and not is_full:
+                self.pixmap_cache[cache_key] = previous # Don't replace a full decode with a preview
+                return
+            self.pixmap_cache_bytes -= previous[0].width() * previous[0].height() * 4
+        self.pixmap_cache[cache_key] = (pixmap, full_size, is_full)
+        self.pixmap_cache_bytes += pixmap.width() * pixmap.height() * 4
+        while self.pixmap_cache_bytes > PIXMAP_CACHE_BYTES and len(self.pixmap_cache) > 1:
+            _, (evicted, _, _) = self.pixmap_cache.popitem(last=False)
+            self.pixmap_cache_bytes -= evicted.width() * evicted.height() * 4
+
+    def on_image_loaded(self, generation, cache_key, image, full_size):
+        if generation == -1:
+            self.prefetching.discard(cache_key)
+            if cache_key != self.awaited_prefetch:
+                if not image.isNull():
+                    pixmap = QPixmap.fromImage(image)
+                    self.cache_pixmap(cache_key, pixmap, full_size, pixmap.size() == full_size)
+                return
+            # The current image was waiting on this prefetch
+            self.awaited_prefetch = None
+            generation = self.load_generation
+        if image.isNull():
+            if generation == self.load_generation:
+                self.show_loaded_pixmap(QPixmap(), full_size)
+            return
+        pixmap = QPixmap.fromImage(image)
+        is_full = pixmap.size() == full_size
+        self.cache_pixmap(cache_key, pixmap, full_size, is_full)
+        if generation != self.load_generation:
+            return # A newer image was selected meanwhile
+        self.show_loaded_pixmap(pixmap, full_size)
+
+    def show_loaded_pixmap(self, pixmap, full_size):
+        is_upgrade = self.displayed_path == self.image_path
+        self.current_pixmap = pixmap
+        self.image_size = full_size
+        if is_upgrade:
+            # Same image at a higher resolution: keep the current zoom and pan
+            self.update_pixmap_display()
+            return
+
+        self.displayed_path = self.image_path
         self.zoom_factor = 1.0
         self.pan_offset = QPoint(0, 0)
         self.is_fitted_to_window = True
         
         # If image is smaller than label, display actual size and center
-        if self.current_pixmap.width() <= self.image_label.width() and \
-           self.current_pixmap.height() <= self.image_label.height():
+        if self.image_size.width() <= self.image_label.width() and \
+           self.image_size.height() <= self.image_label.height():
             self.zoom_to_actual_size()
         else:
             self.fit_to_window()
@@ -199,8 +378,14 @@ class ImageViewer(QWidget):
 
     def clear_image(self):
         self.image_label.clear()
+        self.display_buffer = None
         self.image_label.setText("Select an image to view")
         self.current_pixmap = None
+        self.image_size = QSize()
+        self.image_path = None
+        self.displayed_path = None
+        self.load_generation += 1 # Drop any load still in flight
+        self.awaited_prefetch = None
         self.image_data = None
         # 隐藏导航按钮
         self.hide_navigation_buttons()
@@ -219,6 +404,10 @@ class ImageViewer(QWidget):
         super().resizeEvent(event)
         if hasattr(self, 'is_fitted_to_window') and self.is_fitted_to_window:
             self.fit_to_window()
+        # 更新导航区域（稍微扩大以包含按钮），避免在每次鼠标移动时重新创建
+        extended_width = self.nav_zone_width + 30  # 额外增加30像素以包含按钮
+        self.left_nav_rect = QRect(0, 0, extended_width, self.height())
+        self.right_nav_rect = QRect(self.width() - extended_width, 0, extended_width, self.height())
         # 更新导航按钮位置
         self.update_navigation_buttons_position()
 
@@ -248,11 +437,17 @@ class ImageViewer(QWidget):
             self.pan_offset += delta
             self.constrain_pan_offset()
             self.last_mouse_pos = event.pos()
-            self.update_pixmap_display()
+            # Coalesce move events queued in the same event-loop pass into one redraw
+            if not self.pan_redraw_pending:
+                self.pan_redraw_pending = True
+                QTimer.singleShot(0, self.redraw_pending_pan)
             return
             
         # 检查鼠标是否在导航区域
-        if self.current_pixmap:
+        # 鼠标在图片中部且之前不在导航区域时，无需完整检查
+        x = event.pos().x()
+        near_edge = x <= self.left_nav_rect.right() or x >= self.right_nav_rect.left() # QRect edges are inclusive
+        if self.current_pixmap and (near_edge or self.mouse_in_nav_zone):
             in_nav_zone = self.check_mouse_in_nav_zones(event.pos())
             
             # 只有当状态改变时才更新按钮可见性
@@ -265,7 +460,14 @@ class ImageViewer(QWidget):
     def mouseReleaseEvent(self, event):
         if event.button() == Qt.LeftButton and self.is_panning:
             self.is_panning = False
+            self.pan_redraw_pending = False # Covered by the smooth redraw below
             self.update_cursor()
+            self.update_pixmap_display() # Redraw the last frame with smooth scaling
+
+    def redraw_pending_pan(self):
+        if self.pan_redraw_pending:
+            self.pan_redraw_pending = False
+            self.update_pixmap_display()
 
     def mousePressEvent(self, event):
         if event.button() == Qt.LeftButton and self.is_pannable():
@@ -276,8 +478,7 @@ class ImageViewer(QWidget):
     def is_pannable(self):
         if not self.current_pixmap:
             return False
-        return self.get_scaled_pixmap_rect().width() > self.image_label.width() or \
-               self.get_scaled_pixmap_rect().height() > self.image_label.height()
+        return self.scaled_width > self.image_label.width() or self.scaled_height > self.image_label.height()
 
     def constrain_pan_offset(self):
         if not self.current_pixmap:
@@ -286,20 +487,16 @@ class ImageViewer(QWidget):
         scaled_rect = self.get_scaled_pixmap_rect()
         label_rect = self.image_label.rect()
 
-        # Calculate maximum allowed offsets
-        delta_x = (scaled_rect.width() - label_rect.width()) / 2
-        delta_y = (scaled_rect.height() - label_rect.height()) / 2
+        # Calculate maximum allowed offsets (integer math, QRect sizes are ints)
+        delta_x = (scaled_rect.width() - label_rect.width()) >> 1
+        delta_y = (scaled_rect.height() - label_rect.height()) >> 1
 
         # Clamp the pan offset
-        if delta_x > 0:
-            self.pan_offset.setX(max(-delta_x, min(self.pan_offset.x(), delta_x)))
-        else:
-            self.pan_offset.setX(0)
-
-        if delta_y > 0:
-            self.pan_offset.setY(max(-delta_y, min(self.pan_offset.y(), delta_y)))
-        else:
-            self.pan_offset.setY(0)
+        pan_x = self.pan_offset.x()
+        pan_y = self.pan_offset.y()
+        pan_x = max(-delta_x, min(pan_x, delta_x)) if delta_x > 0 else 0
+        pan_y = max(-delta_y, min(pan_y, delta_y)) if delta_y > 0 else 0
+        self.pan_offset = QPoint(pan_x, pan_y)
 
     def update_cursor(self):
         if self.is_panning:
@@ -312,9 +509,7 @@ class ImageViewer(QWidget):
     def get_scaled_pixmap_rect(self):
         if not self.current_pixmap:
             return QRect()
-        scaled_width = self.current_pixmap.width() * self.zoom_factor
-        scaled_height = self.current_pixmap.height() * self.zoom_factor
-        return QRect(0, 0, scaled_width, scaled_height)
+        return QRect(0, 0, self.scaled_width, self.scaled_height)
 
     def update_navigation_buttons_position(self):
         """更新导航按钮的位置"""
@@ -360,28 +555,27 @@ class ImageViewer(QWidget):
         self.prev_opacity_animation.setEndValue(target_opacity)
         self.next_opacity_animation.setEndValue(target_opacity)
         
+        # 动画期间才需要透明度效果（离屏渲染）
+        self.prev_opacity_effect.setEnabled(True)
+        self.next_opacity_effect.setEnabled(True)
+        
         # 启动动画
-        self.prev_opacity_animation.start()
-        self.next_opacity_animation.start()
+        self.nav_fade_animation.stop()
+        self.nav_fade_animation.start()
+
+    def on_nav_fade_finished(self):
+        """淡入完成后关闭透明度效果，按钮直接绘制，不再经过离屏缓冲"""
+        if self.prev_opacity_effect.opacity() >= 1.0:
+            self.prev_opacity_effect.setEnabled(False)
+            self.next_opacity_effect.setEnabled(False)
 
     def check_mouse_in_nav_zones(self, pos):
         """检查鼠标位置是否在任何导航区域内（包括按钮区域）"""
         if not self.current_pixmap:
             return False
-            
-        # 获取widget的尺寸
-        widget_width = self.width()
-        widget_height = self.height()
-        
-        # 定义左右导航区域（稍微扩大以包含按钮）
-        extended_width = self.nav_zone_width + 30  # 额外增加30像素以包含按钮
-        left_zone = QRect(0, 0, extended_width, widget_height)
-        right_zone = QRect(widget_width - extended_width, 0, extended_width, widget_height)
-        
-        # 检查鼠标是否在任何导航区域内
-        in_any_nav_zone = left_zone.contains(pos) or right_zone.contains(pos)
-        
-        return in_any_nav_zone
+
+        # 导航区域在 resizeEvent 中预先计算
+        return self.left_nav_rect.contains(pos) or self.right_nav_rect.contains(pos)
 
     def paintEvent(self, event):
         """绘制事件 - 可选显示导航区域调试边框"""
@@ -1,5 +1,5 @@
-from PySide6.QtCore import Qt, QSize, Signal, QSortFilterProxyModel
-from PySide6.QtGui import QIcon, QStandardItemModel, QStandardItem, QPixmap, QKeyEvent
+from PySide6.QtCore import Qt, QSize, Signal, QSortFilterProxyModel, QObject, QRunnable, QThreadPool, QTimer
+from PySide6.QtGui import QIcon, QStandardItemModel, QStandardItem, QPixmap, QImage, QImageReader, QKeyEvent
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QListView, QLineEdit, QMenu, QMessageBox, QInputDialog, QLabel, QDialog, QScrollArea, QPushButton, QHBoxLayout
 )
@@ -15,22 +15,137 @@ class HorizontalScrollArea(QScrollArea):
             super().wheelEvent(event)
 
 
+import errno
+import logging
 import os
 import shutil
+import time
+from collections import OrderedDict
+from operator import itemgetter
 from pathlib import Path
 from PIL import Image
 
-from ..config import ICONS, THUMBNAIL_SIZE, GRID_SPACING, LIBRARY_DIR, THUMBNAIL_DIR, ROOT_DIR
+from ..config import ICONS, THUMBNAIL_SIZE, GRID_SPACING, LIBRARY_DIR, THUMBNAIL_DIR, ROOT_DIR, IMAGE_EXTENSIONS
 from .. import image_utils
 
+logger = logging.getLogger(__name__)
+
+class FolderFilterProxyModel(QSortFilterProxyModel):
+    """Shows only the images of one category folder whose filename contains the search text."""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.folder = "" # "" shows images from every folder
+        self.search_text = "" # Lower-cased; "" matches every filename
+
+    def set_folder(self, folder):
+        if folder != self.folder:
+            self.folder = folder
+            self.invalidateFilter()
+
+    def set_search_text(self, text):
+        text = text.lower()
+        if text != self.search_text:
+            self.search_text = text
+            self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        index = self.sourceModel().index(source_row, 0, source_parent)
+        if self.folder and index.data(Qt.UserRole + 2) != self.folder:
+            return False
+        # Items carry a lower-cased copy of their filename, so no case folding per filter pass
+        return not self.search_text or self.search_text in index.data(Qt.UserRole + 3)
+
+class ThumbnailWorkerSignals(QObject):
+    finished = Signal(str, int, int) # image_id, width, height
+    error = Signal(str, str) # image_id, error message
+
+class ThumbnailWorker(QRunnable):
+    """Generates the thumbnail for a freshly imported image on a QThreadPool thread."""
+    def __init__(self, image_id, library_path, thumbnail_path):
+        super().__init__()
+        self.image_id = image_id
+        self.library_path = library_path
+        self.thumbnail_path = thumbnail_path
+        self.signals = ThumbnailWorkerSignals()
+
+    def run(self):
+        try:
+            width, height = image_utils.generate_thumbnail(self.library_path, self.thumbnail_path)
+        except Exception as e:
+            self.signals.error.emit(self.image_id, str(e))
+        else:
+            self.signals.finished.emit(self.image_id, width, height)
+
+class ImportWorkerSignals(QObject):
+    imported = Signal(str, object) # image_id, metadata entry
+    error = Signal(str, str) # file path, error message
+    finished = Signal(int) # number of images imported
+
+class ImportWorker(QRunnable):
+    """
+    Hashes and copies images into the library on a QThreadPool thread.
+    The metadata isn't touched here; the receiver of imported adds each entry.
+    """
+    def __init__(self, paths, target_subfolder, known_entries):
+        super().__init__()
+        self.paths = paths
+        self.target_subfolder = target_subfolder
+        self.known_entries = known_entries # See image_utils.known_content_entries()
+        self.signals = ImportWorkerSignals()
+
+    def run(self):
+        count = 0
+        for path in self.paths:
+            try:
+                image_id, entry = image_utils.import_file(path, self.target_subfolder, self.known_entries)
+            except Exception as e:
+                self.signals.error.emit(path, str(e))
+            else:
+                self.signals.imported.emit(image_id, entry)
+                count += 1
+        self.signals.finished.emit(count)
+
+THUMBNAIL_CACHE_SIZE = 2000 # Decoded thumbnails kept across reloads
+CATEGORY_SCAN_TTL = 1.0 # Seconds a scan of the library's category folders is reused
+
+class ThumbnailLoadSignals(QObject):
+    loaded = Signal(int, str, object, QImage) # generation, image_id, cache key, decoded thumbnail (null if it couldn't be read)
+
+class ThumbnailLoadWorker(QRunnable):
+    """Decodes an existing thumbnail file on a QThreadPool thread."""
+    def __init__(self, generation, image_id, cache_key):
+        super().__init__()
+        self.generation = generation
+        self.image_id = image_id
+        self.cache_key = cache_key
+        self.signals = ThumbnailLoadSignals()
+
+    def run(self):
+        reader = QImageReader(self.cache_key[0])
+        size = reader.size()
+        if size.isValid() and (size.width() > THUMBNAIL_SIZE[0] or size.height() > THUMBNAIL_SIZE[1]):
+            # Thumbnails from older versions may be larger than the icon size; let the decoder downscale them
+            reader.setScaledSize(size.scaled(QSize(*THUMBNAIL_SIZE), Qt.KeepAspectRatio))
+        self.signals.loaded.emit(self.generation, self.image_id, self.cache_key, reader.read())
+
 class ThumbnailGallery(QWidget):
     image_selected = Signal(object) # Emits image_data dict when an image is selected
     status_message = Signal(str, int) # Emits message and timeout for status bar
     library_updated = Signal() # Emits when images are added/deleted/renamed
+    image_data_changed = Signal(object) # Emits image_data dict when an image's metadata changes in place
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.current_folder = "" # Represents the current folder being viewed
+        self.items_by_id = {} # image_id -> QStandardItem for the current view
+        self.pending_thumbnails = {} # image_id -> thumbnail path, for thumbnails still being generated
+        self.current_image_list = None # Cached result of get_current_image_list()
+        self.index_by_path = None # library_path -> (position in current_image_list, proxy row)
+        self.suppress_image_selected = False
+        self.load_generation = 0 # Bumped on every reload so thumbnails decoded for an old view are dropped
+        self.thumbnail_cache = OrderedDict() # thumbnail path -> (mtime_ns, pixmap), in LRU order
+        self.category_folders_scan = None # (monotonic time, library dir mtime, folder names) of the last scan
+        self.category_buttons = [] # "All" followed by the folder buttons; hidden ones are reused later
         self.init_ui()
 
     def init_ui(self):
@@ -61,10 +176,11 @@ class ThumbnailGallery(QWidget):
         self.thumbnail_view = QListView()
         self.thumbnail_model = QStandardItemModel(self.thumbnail_view)
         
-        self.proxy_model = QSortFilterProxyModel()
+        self.proxy_model = FolderFilterProxyModel()
         self.proxy_model.setSourceModel(self.thumbnail_model)
-        self.proxy_model.setFilterCaseSensitivity(Qt.CaseInsensitive)
-        self.proxy_model.setFilterKeyColumn(0) # Filter based on the text (filename)
+        # Inserted rows are always filtered; the filtered data never changes afterwards, so don't
+        # re-run filterAcceptsRow for every dataChanged (e.g. each thumbnail icon that arrives)
+        self.proxy_model.setDynamicSortFilter(False)
         # Removed custom filter settings
 
         self.thumbnail_view.setModel(self.proxy_model) # Directly use thumbnail_model
@@ -78,22 +194,59 @@ class ThumbnailGallery(QWidget):
         self.thumbnail_view.setSelectionMode(QListView.ExtendedSelection) # Allow multiple selection
         self.thumbnail_view.setFlow(QListView.LeftToRight) # Arrange items from left to right
         self.thumbnail_view.setLayoutMode(QListView.Batched) # Use batched layout for better performance
+        self.thumbnail_view.setUniformItemSizes(True) # Every cell has the grid size, so skip per-item size queries
         self.thumbnail_view.setWordWrap(True) # Revert to word wrap for two-column display
         self.thumbnail_view.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff) # No horizontal scroll for thumbnails
         self.thumbnail_view.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded) # Vertical scroll for thumbnails
         self.thumbnail_view.setContextMenuPolicy(Qt.CustomContextMenu) # Enable custom context menu
         self.layout.addWidget(self.thumbnail_view)
 
+        self.create_context_menus()
         self.setup_connections()
 
+    def create_context_menus(self):
+        """Builds the context menus once; they are reused for every right-click."""
+        self.category_menu = QMenu(self)
+        self.rename_category_action = self.category_menu.addAction(ICONS["rename"], "Rename Category") # New action
+        self.delete_category_action = self.category_menu.addAction(ICONS["delete"], "Delete Category") # Changed text and added icon
+
+        self.thumbnail_menu = QMenu(self)
+        self.rename_image_action = self.thumbnail_menu.addAction(ICONS["rename"], "Rename Image")
+        self.change_selected_category_action = self.thumbnail_menu.addAction(ICONS["import"], "Change  Images Category") # New action
+        self.delete_selected_action = self.thumbnail_menu.addAction(ICONS["delete"], "Delete  Images")
+
     def setup_connections(self):
-        self.search_bar.textChanged.connect(self.proxy_model.setFilterRegularExpression)
+        # Filter once typing pauses, with a plain case-insensitive substring match rather than a regex
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(300)
+        self.search_timer.timeout.connect(self.apply_search_filter)
+        self.search_bar.textChanged.connect(self.search_timer.start)
         self.thumbnail_view.selectionModel().selectionChanged.connect(self.on_thumbnail_selected)
         self.thumbnail_view.customContextMenuRequested.connect(self.show_thumbnail_context_menu)
         self.thumbnail_view.doubleClicked.connect(self.on_item_double_clicked)
         # Removed category_filter_combo connection
+        # Any change to the visible rows (reload, filtering, inserts, removals) invalidates the cached image list
+        for signal in (self.proxy_model.modelReset, self.proxy_model.layoutChanged, self.proxy_model.rowsInserted,
+                       self.proxy_model.rowsRemoved):
+            signal.connect(self.invalidate_image_list)
+        self.proxy_model.dataChanged.connect(self.on_proxy_data_changed)
+
+    def apply_search_filter(self):
+        self.proxy_model.set_search_text(self.search_bar.text())
+
+    def invalidate_image_list(self, *args):
+        self.current_image_list = None
+        self.index_by_path = None
+
+    def on_proxy_data_changed(self, top_left, bottom_right, roles=()):
+        # Icon updates (setIcon) leave the cached list valid; only the image_id role feeds get_item_image_data
+        if not roles or Qt.UserRole + 1 in roles:
+            self.invalidate_image_list()
 
     def on_thumbnail_selected(self, selected, deselected):
+        if self.suppress_image_selected:
+            return # Highlight only (see select_image_by_data)
         indexes = selected.indexes()
         if not indexes:
             self.image_selected.emit(None)
@@ -102,109 +255,180 @@ class ThumbnailGallery(QWidget):
         # Only emit the first selected image for display in ImageViewer
         proxy_index = indexes[0]
         source_index = self.proxy_model.mapToSource(proxy_index)
-        item_data = self.thumbnail_model.itemFromIndex(source_index).data(Qt.UserRole)
+        item_data = self.get_item_image_data(self.thumbnail_model.itemFromIndex(source_index))
         
         # Check if the selected item is an image (not a folder or '..')
-        if isinstance(item_data, dict) and "library_path" in item_data:
+        if item_data is not None:
             self.image_selected.emit(item_data)
         else:
             self.image_selected.emit(None)
 
     def load_thumbnails(self, folder_path=""):
+        previous_count = self.thumbnail_model.rowCount()
         self.thumbnail_model.clear()
+        self.items_by_id.clear()
+        self.load_generation += 1
         self.current_folder = folder_path
 
+        # The model always holds the whole library; the proxy shows the current folder
+        self.proxy_model.set_folder(self.current_folder)
+
         try:
-            # Clear existing category buttons
-            for i in reversed(range(self.category_buttons_layout.count())):
-                widget = self.category_buttons_layout.itemAt(i).widget()
-                if widget is not None:
-                    widget.deleteLater()
-            
-            # Add "All" button
-            all_button = QPushButton("All")
-            all_button.setCheckable(True)
-            all_button.setFixedWidth(100) # Fixed width for button
-            all_button.setFixedHeight(30) # Fixed height for button
-            all_button.clicked.connect(lambda: self.filter_by_category_button(""))
-            self.category_buttons_layout.addWidget(all_button)
+            self.refresh_categories()
 
-            metadata = image_utils.load_metadata()
-            
-            all_top_level_folders = set()
-            # Collect top-level folders from file system (including empty ones)
-            for entry in LIBRARY_DIR.iterdir():
-                if entry.is_dir() and entry.name != THUMBNAIL_DIR.name and not entry.name.startswith("."):
-                    # Check if this folder contains any subdirectories
-                    has_subdirectories = False
-                    for sub_entry in entry.iterdir():
-                        if sub_entry.is_dir():
-                            has_subdirectories = True
-                            break
-                    
-                    if not has_subdirectories: # Only add if it does not contain subdirectories
-                        all_top_level_folders.add(entry.name)
-            
-            # Add subfolder buttons
-            for folder_name in sorted(list(all_top_level_folders)):
-                folder_button = QPushButton(folder_name)
-                folder_button.setCheckable(True)
-                folder_button.setFixedWidth(100) # Fixed width for button
-                folder_button.setFixedHeight(30) # Fixed height for button
-                folder_button.clicked.connect(lambda checked, fn=folder_name: self.filter_by_category_button(fn))
-                self.category_buttons_layout.addWidget(folder_button)
-
-            # Add a stretch to push buttons to the left
-            # self.category_buttons_layout.addStretch(1)
-
-            # Ensure only one button is checked
-            if not self.current_folder:
-                all_button.setChecked(True)
-            else:
-                found_checked = False
-                for i in range(self.category_buttons_layout.count()):
-                    button = self.category_buttons_layout.itemAt(i).widget()
-                    if button and button.text() == self.current_folder:
-                        button.setChecked(True)
-                        found_checked = True
-                        break
-                if not found_checked:
-                    all_button.setChecked(True) # Fallback if current_folder not found in buttons
-
-            # Filter images for display in QListView
-            # Use the new function to get filtered metadata
-            if self.current_folder == "": # "All" category
-                images_to_display = image_utils.get_image_metadata_for_folder(recursive=True)
-            else: # Specific folder
-                images_to_display = image_utils.get_image_metadata_for_folder(self.current_folder, recursive=False)
-
-            # Add image items, sorted by timestamp (newest first)
-            for image_id, item_data in sorted(images_to_display.items(), key=lambda x: x[1].get("timestamp", 0), reverse=True):
-                # Ensure image_id is part of item_data for consistent access
-                item_data["image_id"] = image_id
-
-                thumbnail_path = Path(item_data["thumbnail_path"])
-                print(f"Checking thumbnail path: {thumbnail_path}, exists: {thumbnail_path.exists()}") # Debug print
-                
-                pixmap = QPixmap(str(thumbnail_path))
-                print(f"Pixmap null status: {pixmap.isNull()}") # Debug print
-                if not pixmap.isNull():
-                    icon = QIcon(pixmap)
-                    item = QStandardItem(icon, item_data["original_filename"])
-                else:
-                    item = QStandardItem(QIcon(), item_data["original_filename"]) # Empty icon
-                    self.status_message.emit(f"Warning: Could not load thumbnail for {item_data['original_filename']}", 3000)
-                
-                # Store image_id and all metadata for later use
-                item.setData(item_data["image_id"], Qt.UserRole + 1) # Store image_id
-                item.setData(item_data, Qt.UserRole) # Store full item_data
-                item.setEditable(False)
-                self.thumbnail_model.appendRow(item)
+            images_to_display = image_utils.get_image_metadata_for_folder(recursive=True)
 
-            self.library_updated.emit() # Notify main window that library count might have changed
+            # Add image items, sorted by timestamp (newest first), in one insertion
+            rows = [(item_data.get("timestamp", 0), image_id, item_data) for image_id, item_data in images_to_display.items()]
+            rows.sort(key=itemgetter(0), reverse=True)
+            items = [self.create_thumbnail_item(image_id, item_data) for _, image_id, item_data in rows]
+            self.thumbnail_view.setUpdatesEnabled(False)
+            try:
+                self.thumbnail_model.invisibleRootItem().appendRows(items)
+            finally:
+                self.thumbnail_view.setUpdatesEnabled(True)
+
+            if self.thumbnail_model.rowCount() != previous_count:
+                self.library_updated.emit() # Notify main window that library count changed
         except Exception as e:
             self.status_message.emit(f"Error loading thumbnails: {e}", 0)
 
+    def refresh_categories(self):
+        """Updates the category buttons to match the library's folders on disk."""
+        all_top_level_folders = self.scan_category_folders()
+
+        # Add "All" button (created once)
+        if not self.category_buttons:
+            all_button = self.create_category_button("All")
+            all_button.clicked.connect(lambda: self.filter_by_category_button(""))
+        
+        # Reuse the existing subfolder buttons, only creating new ones when there are more folders than before
+        for i, folder_name in enumerate(all_top_level_folders, start=1):
+            if i == len(self.category_buttons):
+                folder_button = self.create_category_button(folder_name)
+                folder_button.clicked.connect(lambda checked, i=i: self.filter_by_category_button(self.category_buttons[i].text()))
+            else:
+                folder_button = self.category_buttons[i]
+                folder_button.setText(folder_name)
+                folder_button.show()
+        visible_count = len(all_top_level_folders) + 1
+        for folder_button in self.category_buttons[visible_count:]:
+            folder_button.hide() # Kept for reuse when folders are added again
+
+        # Add a stretch to push buttons to the left
+        # self.category_buttons_layout.addStretch(1)
+
+        # Ensure only one button is checked (falls back to "All" if current_folder has no button)
+        checked_name = self.current_folder if self.current_folder in all_top_level_folders else "All"
+        for folder_button in self.category_buttons[:visible_count]:
+            folder_button.setChecked(folder_button.text() == checked_name)
+
+    def create_category_button(self, text):
+        button = QPushButton(text)
+        button.setCheckable(True)
+        button.setFixedWidth(100) # Fixed width for button
+        button.setFixedHeight(30) # Fixed height for button
+        self.category_buttons_layout.addWidget(button)
+        self.category_buttons.append(button)
+        return button
+
+    def scan_category_folders(self):
+        """Returns the sorted top-level library folders that don't contain subdirectories (including empty ones)."""
+        # Rapid successive reloads reuse the last scan while the library folder itself is unchanged
+        library_mtime = os.stat(LIBRARY_DIR).st_mtime_ns
+        now = time.monotonic()
+        if self.category_folders_scan is not None:
+            scanned_at, scanned_mtime, folders = self.category_folders_scan
+            if now - scanned_at < CATEGORY_SCAN_TTL and scanned_mtime == library_mtime:
+                return folders
+
+        folders = set()
+        with os.scandir(LIBRARY_DIR) as entries:
+            for entry in entries:
+                if not entry.is_dir(follow_symlinks=False) or entry.name == THUMBNAIL_DIR.name or entry.name.startswith("."):
+                    continue
+                # Only add if it does not contain subdirectories
+                with os.scandir(entry.path) as sub_entries:
+                    if not any(sub_entry.is_dir(follow_symlinks=False) for sub_entry in sub_entries):
+                        folders.add(entry.name)
+        # Sorted once per scan, case-insensitively, so reused scans need no sorting
+        folders = tuple(sorted(folders, key=str.casefold))
+        self.category_folders_scan = (now, library_mtime, folders)
+        return folders
+
+    def create_thumbnail_item(self, image_id, item_data):
+        # Thumbnails decoded by an earlier load are reused while the file is unchanged;
+        # otherwise the icon is filled in once it has been decoded in the background
+        item = QStandardItem(QIcon(), item_data["original_filename"])
+        if image_id not in self.pending_thumbnails: # Otherwise it shows up once generated
+            cache_key = image_utils.image_cache_key(item_data["thumbnail_path"])
+            cached = self.thumbnail_cache.get(cache_key[0])
+            if cached is not None and cached[0] == cache_key[1]:
+                self.thumbnail_cache.move_to_end(cache_key[0])
+                item.setIcon(QIcon(cached[1]))
+            else:
+                worker = ThumbnailLoadWorker(self.load_generation, image_id, cache_key)
+                worker.signals.loaded.connect(self.on_thumbnail_loaded)
+                QThreadPool.globalInstance().start(worker)
+        
+        # Only the image_id is stored; the metadata is looked up when needed (see get_item_image_data)
+        item.setData(image_id, Qt.UserRole + 1) # Store image_id
+        item.setData(item_data.get("subfolder", ""), Qt.UserRole + 2) # Store subfolder for the folder filter
+        item.setData(item_data["original_filename"].lower(), Qt.UserRole + 3) # Store lower-cased filename for the search filter
+        item.setEditable(False)
+        self.items_by_id[image_id] = item
+        return item
+
+    def on_thumbnail_loaded(self, generation, image_id, cache_key, image):
+        pixmap = None
+        if not image.isNull():
+            pixmap = QPixmap.fromImage(image)
+            # Cached even if the view changed meanwhile, so the next reload can use it
+            self.thumbnail_cache[cache_key[0]] = (cache_key[1], pixmap)
+            self.thumbnail_cache.move_to_end(cache_key[0])
+            if len(self.thumbnail_cache) > THUMBNAIL_CACHE_SIZE:
+                self.thumbnail_cache.popitem(last=False)
+        if generation != self.load_generation:
+            return # The view was reloaded meanwhile
+        item = self.items_by_id.get(image_id)
+        if item is None:
+            return
+        logger.debug("Thumbnail null status for %s: %s", image_id, pixmap is None)
+        if pixmap is None:
+            self.status_message.emit(f"Warning: Could not load thumbnail for {item.text()}", 3000)
+            return
+        item.setIcon(QIcon(pixmap))
+
+    def forget_thumbnails(self, image_ids):
+        """Drops cached thumbnails of images that are being deleted or renamed."""
+        metadata = image_utils.load_metadata()
+        for image_id in image_ids:
+            item_data = metadata.get(image_id)
+            if item_data is not None:
+                self.thumbnail_cache.pop(item_data["thumbnail_path"], None)
+
+    def get_item_image_data(self, item):
+        """Returns the metadata of the image shown by item (including its image_id), or None."""
+        image_id = item.data(Qt.UserRole + 1)
+        item_data = image_utils.load_metadata().get(image_id)
+        if item_data is None:
+            return None
+        return dict(item_data, image_id=image_id)
+
+    def add_image(self, image_id, item_data):
+        """Adds a single new image to the current view without reloading the whole folder."""
+        self.add_images([dict(item_data, image_id=image_id)])
+
+    def add_images(self, new_items):
+        """Adds newly imported images (item_data dicts with image_id) to the current view."""
+        if new_items:
+            # Newest images are listed first; the proxy hides those from other folders
+            new_items = sorted(new_items, key=lambda item_data: item_data.get("timestamp", 0), reverse=True)
+            items = [self.create_thumbnail_item(item_data["image_id"], item_data) for item_data in new_items]
+            self.thumbnail_model.invisibleRootItem().insertRows(0, items)
+            self.thumbnail_view.scrollToTop()
+        self.library_updated.emit()
+
     def filter_by_category_button(self, category_folder):
         # Iterate through all buttons to manage their checked state
         for i in range(self.category_buttons_layout.count()):
@@ -221,7 +445,10 @@ class ThumbnailGallery(QWidget):
                 
                 button.setChecked(should_be_checked)
         
-        self.load_thumbnails(category_folder)
+        # Switching folders only re-filters the rows already loaded, no reload from disk
+        self.current_folder = category_folder
+        self.proxy_model.set_folder(category_folder)
+        self.thumbnail_view.scrollToTop()
 
     def show_category_context_menu(self, pos):
         # Get the button that was right-clicked
@@ -233,14 +460,11 @@ class ThumbnailGallery(QWidget):
         if folder_name == "All": # Cannot delete the "All" category
             return
 
-        menu = QMenu()
-        rename_action = menu.addAction(ICONS["rename"], "Rename Category") # New action
-        delete_action = menu.addAction(ICONS["delete"], "Delete Category") # Changed text and added icon
-        action = menu.exec(self.category_buttons_widget.mapToGlobal(pos)) # Map position relative to the widget
+        action = self.category_menu.exec(self.category_buttons_widget.mapToGlobal(pos)) # Map position relative to the widget
 
-        if action == delete_action:
+        if action == self.delete_category_action:
             self.delete_category_folder(folder_name)
-        elif action == rename_action:
+        elif action == self.rename_category_action:
             self.rename_category_folder(folder_name)
 
     def rename_category_folder(self, old_folder_name):
@@ -248,8 +472,7 @@ class ThumbnailGallery(QWidget):
                                                  QLineEdit.Normal, old_folder_name)
         if ok and new_folder_name and new_folder_name != old_folder_name:
             # Sanitize new_folder_name
-            sanitized_name = "".join(c for c in new_folder_name if c.isalnum() or c in (' ', '-', '_')).strip()
-            sanitized_name = sanitized_name.replace(" ", "_")
+            sanitized_name = image_utils.sanitize_name(new_folder_name).replace(" ", "_")
             if not sanitized_name:
                 self.status_message.emit("Invalid new category name.", 3000)
                 return
@@ -265,14 +488,14 @@ class ThumbnailGallery(QWidget):
                 # Rename folder on disk
                 old_path.rename(new_path)
 
-                # Update metadata for all images in this category
+                # Update metadata for all images in this category (looked up through the subfolder index)
                 metadata = image_utils.load_metadata()
-                for image_id, item_data in metadata.items():
-                    if item_data.get("subfolder", "") == old_folder_name:
-                        item_data["subfolder"] = sanitized_name
-                        # Also update library_path to reflect new folder location
-                        old_library_path = Path(item_data["library_path"])
-                        item_data["library_path"] = str(new_path / old_library_path.name)
+                for image_id in image_utils.metadata_store.subfolder_index().get(old_folder_name, []):
+                    item_data = metadata[image_id]
+                    item_data["subfolder"] = sanitized_name
+                    # Also update library_path to reflect new folder location
+                    old_library_path = Path(item_data["library_path"])
+                    item_data["library_path"] = str(new_path / old_library_path.name)
                 image_utils.save_metadata(metadata)
 
                 self.status_message.emit(f"Category '{old_folder_name}' renamed to '{sanitized_name}'.", 5000)
@@ -293,20 +516,23 @@ class ThumbnailGallery(QWidget):
                     shutil.rmtree(folder_path_on_disk)
 
                 # 2. Remove associated images and metadata
+                # Only the subfolders inside the deleted folder are looked at, not every image
                 metadata = image_utils.load_metadata()
-                image_ids_to_remove = []
-                for image_id, item_data in metadata.items():
-                    item_subfolder = item_data.get("subfolder", "")
-                    if item_subfolder == folder_name or item_subfolder.startswith(f"{folder_name}/"):
-                        # Delete thumbnail file
-                        thumbnail_path = Path(item_data["thumbnail_path"])
-                        if thumbnail_path.exists():
-                            thumbnail_path.unlink()
-                        image_ids_to_remove.append(image_id)
+                subfolder_index = image_utils.metadata_store.subfolder_index()
+                prefix = f"{folder_name}/"
+                image_ids_to_remove = [image_id for subfolder, image_ids in subfolder_index.items()
+                                       if subfolder == folder_name or subfolder.startswith(prefix)
+                                       for image_id in image_ids]
+                for image_id in image_ids_to_remove:
+                    # Delete thumbnail file
+                    thumbnail_path = Path(metadata[image_id]["thumbnail_path"])
+                    if thumbnail_path.exists():
+                        thumbnail_path.unlink()
+                    self.thumbnail_cache.pop(metadata[image_id]["thumbnail_path"], None)
                 
                 for image_id in image_ids_to_remove:
-                    del metadata[image_id]
-                image_utils.save_metadata(metadata)
+                    image_utils.metadata_store.remove(image_id)
+                image_utils.metadata_store.flush()
 
                 self.status_message.emit(f"Folder '{folder_name}' and its contents deleted.", 5000)
                 self.load_thumbnails("") # Reload to "All" view after deletion
@@ -322,9 +548,68 @@ class ThumbnailGallery(QWidget):
         pass
 
     def process_imported_paths(self, file_paths, target_subfolder=""):
-        for path in file_paths:
-            image_utils.process_and_copy_image(path, target_subfolder)
-        self.load_thumbnails(self.current_folder) # Reload current view
+        """Imports files in the background; each image shows up in the gallery once it has been copied."""
+        worker = ImportWorker(list(map(str, file_paths)), target_subfolder, image_utils.known_content_entries())
+        worker.signals.imported.connect(self.on_image_imported)
+        worker.signals.error.connect(self.on_import_failed)
+        worker.signals.finished.connect(self.on_import_finished)
+        QThreadPool.globalInstance().start(worker)
+
+    def on_image_imported(self, image_id, entry):
+        image_utils.metadata_store.add(image_id, entry)
+        item_data = dict(entry, image_id=image_id)
+        self.queue_thumbnails([item_data])
+        self.add_images([item_data])
+
+    def on_import_failed(self, path, error):
+        logger.warning("Could not import %s: %s", path, error)
+        self.status_message.emit(f"Could not import {os.path.basename(path)}: {error}", 3000)
+
+    def on_import_finished(self, count):
+        image_utils.metadata_store.flush() # One write for the whole batch
+
+    def queue_thumbnails(self, imported_items):
+        """Generates missing thumbnails in the background; items get their icons as they finish."""
+        pool = QThreadPool.globalInstance()
+        for item_data in imported_items:
+            if not image_utils.needs_thumbnail(item_data):
+                continue # Linked from an existing duplicate
+            image_id = item_data["image_id"]
+            worker = ThumbnailWorker(image_id, item_data["library_path"], item_data["thumbnail_path"])
+            worker.signals.finished.connect(self.on_thumbnail_generated)
+            worker.signals.error.connect(self.on_thumbnail_failed)
+            self.pending_thumbnails[image_id] = item_data["thumbnail_path"]
+            pool.start(worker)
+
+    def on_thumbnail_generated(self, image_id, width, height):
+        entry = image_utils.load_metadata().get(image_id)
+        if entry is None:
+            # Deleted while its thumbnail was being generated, so the new thumbnail is an orphan
+            thumbnail_path = self.pending_thumbnails.get(image_id)
+            if thumbnail_path is not None:
+                Path(thumbnail_path).unlink(missing_ok=True)
+            self.finish_thumbnail(image_id)
+            return
+        image_utils.metadata_store.update(image_id, width=width, height=height)
+        # Keep the cached copy in step with the metadata, so the list need not be rebuilt
+        if self.current_image_list is not None:
+            position = self.index_of(entry["library_path"])
+            if position != -1:
+                self.current_image_list[position].update(width=width, height=height)
+        self.image_data_changed.emit(dict(entry, image_id=image_id))
+        item = self.items_by_id.get(image_id)
+        if item is not None:
+            item.setIcon(QIcon(entry["thumbnail_path"]))
+        self.finish_thumbnail(image_id)
+
+    def on_thumbnail_failed(self, image_id, error):
+        logger.warning("Could not create thumbnail for %s: %s", image_id, error)
+        self.finish_thumbnail(image_id)
+
+    def finish_thumbnail(self, image_id):
+        self.pending_thumbnails.pop(image_id, None)
+        if not self.pending_thumbnails:
+            image_utils.metadata_store.flush() # Persist the dimensions once the queue drains
 
     def process_imported_folder(self, folder_path, target_subfolder=""):
         # This function will now import only images directly from the selected folder
@@ -333,45 +618,38 @@ class ThumbnailGallery(QWidget):
         image_files = []
         for file in os.listdir(folder_path):
             full_path = os.path.join(folder_path, file)
-            if os.path.isfile(full_path) and file.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')):
+            if os.path.splitext(file)[1].lower() in IMAGE_EXTENSIONS and os.path.isfile(full_path):
                 image_files.append(full_path)
         
         if not image_files:
             self.status_message.emit(f"No images found directly in '{folder_path}'.", 3000)
             return
 
-        for path in image_files:
-            image_utils.process_and_copy_image(path, target_subfolder)
-        self.load_thumbnails(self.current_folder) # Reload current view
+        self.process_imported_paths(image_files, target_subfolder)
 
     def show_thumbnail_context_menu(self, position):
         index = self.thumbnail_view.indexAt(position)
-        print(f"Context menu requested. Index valid: {index.isValid()}") # Debug print
+        logger.debug("Context menu requested. Index valid: %s", index.isValid())
         if not index.isValid():
             return
 
         # Map the proxy index back to the source model index
         source_index = self.proxy_model.mapToSource(index)
         item = self.thumbnail_model.itemFromIndex(source_index)
-        print(f"Item from index: {item}") # Debug print
+        logger.debug("Item from index: %s", item)
         
         if item:
-            image_data = item.data(Qt.UserRole)
-            print(f"Image data from item: {image_data}") # Debug print
-            if isinstance(image_data, dict) and "library_path" in image_data: # Ensure it's an image item
-                menu = QMenu()
-                rename_action = menu.addAction(ICONS["rename"], "Rename Image")
-                change_selected_category_action = menu.addAction(ICONS["import"], "Change  Images Category") # New action
-                delete_selected_action = menu.addAction(ICONS["delete"], "Delete  Images")
-                
-                action = menu.exec(self.thumbnail_view.mapToGlobal(position))
+            image_data = self.get_item_image_data(item)
+            logger.debug("Image data from item: %s", image_data)
+            if image_data is not None: # Ensure it's an image item
+                action = self.thumbnail_menu.exec(self.thumbnail_view.mapToGlobal(position))
 
-                if action == rename_action:
+                if action == self.rename_image_action:
                     self.rename_image(image_data["image_id"], image_data["original_filename"])
                 
-                elif action == change_selected_category_action:
+                elif action == self.change_selected_category_action:
                     self.change_selected_images_category()
-                elif action == delete_selected_action:
+                elif action == self.delete_selected_action:
                     self.delete_selected_images()
 
     def change_selected_images_category(self):
@@ -382,7 +660,7 @@ class ThumbnailGallery(QWidget):
 
         dialog = FolderSelectionDialog(parent=self)
         if dialog.exec():
-            new_subfolder = dialog.get_selected_folder()
+            new_subfolder = image_utils.normalize_subfolder(dialog.get_selected_folder())
 
             metadata = image_utils.load_metadata()
             images_moved_count = 0
@@ -407,8 +685,13 @@ class ThumbnailGallery(QWidget):
                         new_library_dir.mkdir(parents=True, exist_ok=True)
                         new_library_path = new_library_dir / old_library_path.name
 
-                        # Move the file on disk
-                        shutil.move(str(old_library_path), str(new_library_path))
+                        # Move the file on disk; a plain rename unless the library spans filesystems
+                        try:
+                            os.replace(old_library_path, new_library_path)
+                        except OSError as e:
+                            if e.errno != errno.EXDEV:
+                                raise
+                            shutil.move(str(old_library_path), str(new_library_path))
 
                         # Update metadata
                         item_data["library_path"] = str(new_library_path)
@@ -418,8 +701,9 @@ class ThumbnailGallery(QWidget):
                         self.status_message.emit(f"Error moving image {item_data['original_filename']}: {e}", 0)
             
             if images_moved_count > 0:
+                self.category_folders_scan = None # The move may have created nested folders
                 image_utils.save_metadata(metadata)
-                self.status_message.emit(f"Successfully moved {images_moved_count} images to category '{new_subfolder if new_subfolder else "Root Folder"}'.", 5000)
+                self.status_message.emit(f"Successfully moved {images_moved_count} images to category '{new_subfolder if new_subfolder else 'Root Folder'}'.", 5000)
                 self.load_thumbnails(self.current_folder) # Reload current view
             else:
                 self.status_message.emit("No images were moved.", 3000)
@@ -444,8 +728,8 @@ class ThumbnailGallery(QWidget):
                     if image_id:
                         image_ids_to_delete.append(image_id)
                 
-                for image_id in image_ids_to_delete:
-                    image_utils.remove_image_files(image_id)
+                self.forget_thumbnails(image_ids_to_delete)
+                image_utils.remove_image_files_bulk(image_ids_to_delete)
                 
                 self.status_message.emit(f"Successfully deleted {len(image_ids_to_delete)} images.", 3000)
                 self.load_thumbnails(self.current_folder) # Reload current view
@@ -454,37 +738,52 @@ class ThumbnailGallery(QWidget):
 
     def get_current_image_list(self):
         """获取当前显示的图片列表"""
+        if self.current_image_list is not None:
+            return self.current_image_list
         image_list = []
+        index_by_path = {}
         
         # 遍历当前模型中的所有项目
         for row in range(self.proxy_model.rowCount()):
             proxy_index = self.proxy_model.index(row, 0)
             source_index = self.proxy_model.mapToSource(proxy_index)
-            item_data = self.thumbnail_model.itemFromIndex(source_index).data(Qt.UserRole)
+            item_data = self.get_item_image_data(self.thumbnail_model.itemFromIndex(source_index))
             
-            # 只添加图片数据，不添加文件夹数据
-            if isinstance(item_data, dict) and "library_path" in item_data:
+            # 只添加图片数据，不添加文件夹数据；跳过的行使列表位置与代理行号不再一致，因此同时记录代理行号
+            if item_data is not None:
+                index_by_path[item_data["library_path"]] = (len(image_list), row)
                 image_list.append(item_data)
         
+        self.current_image_list = image_list
+        self.index_by_path = index_by_path
         return image_list
+
+    def index_of(self, library_path):
+        """返回图片在当前列表中的索引，不存在时返回 -1"""
+        if self.index_by_path is None:
+            self.get_current_image_list()
+        return self.index_by_path.get(library_path, (-1, -1))[0]
     
-    def select_image_by_data(self, image_data):
-        """根据图片数据选择图片"""
-        target_path = image_data["library_path"]
+    def select_image_by_data(self, image_data, emit=True):
+        """根据图片数据选择图片；emit 为 False 时只高亮缩略图，不发送 image_selected"""
+        if self.index_by_path is None:
+            self.get_current_image_list()
+        position, row = self.index_by_path.get(image_data["library_path"], (-1, -1))
+        if position == -1:
+            return
+        item_data = self.current_image_list[position]
+        proxy_index = self.proxy_model.index(row, 0)
         
-        # 查找匹配的项目
-        for row in range(self.proxy_model.rowCount()):
-            proxy_index = self.proxy_model.index(row, 0)
-            source_index = self.proxy_model.mapToSource(proxy_index)
-            item_data = self.thumbnail_model.itemFromIndex(source_index).data(Qt.UserRole)
-            
-            if isinstance(item_data, dict) and item_data.get("library_path") == target_path:
-                # 选择该项目
-                self.thumbnail_view.setCurrentIndex(proxy_index)
-                self.thumbnail_view.scrollTo(proxy_index)
-                # 手动触发选择事件
-                self.image_selected.emit(item_data)
-                break
+        # 选择该项目
+        self.suppress_image_selected = True
+        try:
+            self.thumbnail_view.setCurrentIndex(proxy_index)
+        finally:
+            self.suppress_image_selected = False
+        self.thumbnail_view.scrollTo(proxy_index)
+        # 手动触发选择事件
+        if emit:
+            self.image_selected.emit(item_data)
 
     def rename_image(self, image_id, current_filename):
         new_filename, ok = QInputDialog.getText(self, "Rename Image", "Enter new filename:",
@@ -500,12 +799,14 @@ class ThumbnailGallery(QWidget):
                 new_filename_with_ext = Path(new_filename).stem + old_library_path.suffix
                 
                 new_library_path = old_library_path.parent / new_filename_with_ext
-                new_thumbnail_path = old_thumbnail_path.parent / new_filename_with_ext
+                # Thumbnails keep their own format (WebP), so keep their suffix too
+                new_thumbnail_path = old_thumbnail_path.with_name(Path(new_filename).stem + old_thumbnail_path.suffix)
 
                 try:
                     # Rename files on disk
                     old_library_path.rename(new_library_path)
                     old_thumbnail_path.rename(new_thumbnail_path)
+                    self.thumbnail_cache.pop(str(old_thumbnail_path), None)
 
                     # Update metadata
                     item_data["original_filename"] = new_filename_with_ext
@@ -527,6 +828,7 @@ class ThumbnailGallery(QWidget):
 
         if reply == QMessageBox.Yes:
             try:
+                self.forget_thumbnails([image_id])
                 image_utils.remove_image_files(image_id)
                 self.status_message.emit("Image deleted.", 3000)
                 self.load_thumbnails(self.current_folder) # Reload current view
@@ -0,0 +1,32 @@
+import os
+
+import pytest
+from PIL import Image
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen") # Widget tests run without a display
+
+from image_manager import image_utils
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    """Points image_utils at an empty library under tmp_path with a fresh metadata store."""
+    library_dir = tmp_path / "image_library"
+    thumbnail_dir = tmp_path / "thumbnails"
+    library_dir.mkdir()
+    thumbnail_dir.mkdir()
+    monkeypatch.setattr(image_utils, "LIBRARY_DIR", library_dir)
+    monkeypatch.setattr(image_utils, "THUMBNAIL_DIR", thumbnail_dir)
+    monkeypatch.setattr(image_utils, "METADATA_FILE", tmp_path / "metadata.json")
+    store = image_utils.MetadataStore()
+    monkeypatch.setattr(image_utils, "metadata_store", store)
+    yield store
+    store.close() # Finish background writes while the paths are still patched
+
+
+@pytest.fixture
+def make_image():
+    def make(path, color, size=(40, 30)):
+        Image.new("RGB", size, color).save(path)
+        return path
+    return make
@@ -0,0 +1,131 @@
+import os
+
+import pytest
+from PIL import Image
+
+from image_manager import image_utils
+
+
+def test_flush_and_replace_round_trip(library):
+    library.add("a", {"library_path": "a.png", "subfolder": "", "content_hash": "1"})
+    library.flush(wait=True)
+    assert image_utils.METADATA_FILE.exists()
+    assert not image_utils.METADATA_FILE.with_name("metadata.json.tmp").exists()
+    assert image_utils._read_metadata_file() == library.data
+
+    image_utils.save_metadata({"b": {"library_path": "b.png", "subfolder": "cats", "content_hash": "2"}})
+    library.close()
+    reloaded = image_utils.MetadataStore()
+    assert reloaded.data == {"b": {"library_path": "b.png", "subfolder": "cats", "content_hash": "2"}}
+
+
+def test_flush_without_changes_writes_nothing(library):
+    library.flush(wait=True)
+    assert not image_utils.METADATA_FILE.exists()
+
+
+def test_subfolder_index_follows_changes(library):
+    library.add("a", {"subfolder": "cats"})
+    library.add("b", {"subfolder": "dogs\\small"}) # Older entries may use backslashes
+    assert library.subfolder_index() == {"cats": ["a"], "dogs/small": ["b"]}
+
+    library.remove("a")
+    library.add("c", {"subfolder": ""})
+    assert library.subfolder_index() == {"dogs/small": ["b"], "": ["c"]}
+
+    library.replace({"d": {"subfolder": "birds"}})
+    assert library.subfolder_index() == {"birds": ["d"]}
+
+
+def import_batch(store, paths, target_subfolder=""):
+    """Imports files the way ImportWorker does and adds the entries as the gallery does."""
+    known_entries = image_utils.known_content_entries()
+    imported = []
+    for path in paths:
+        image_id, entry = image_utils.import_file(str(path), target_subfolder, known_entries)
+        store.add(image_id, entry)
+        imported.append(dict(entry, image_id=image_id))
+    return imported
+
+
+def test_import_links_duplicates(library, tmp_path, make_image):
+    red = make_image(tmp_path / "red.png", "red")
+    blue = make_image(tmp_path / "blue.png", "blue")
+    red_copy = tmp_path / "red_copy.png"
+    red_copy.write_bytes(red.read_bytes())
+
+    first = import_batch(library, [red, blue])
+    assert [item["original_filename"] for item in first] == ["red.png", "blue.png"]
+    assert first[0]["content_hash"] != first[1]["content_hash"]
+    assert (first[0]["width"], first[0]["height"]) == (40, 30)
+    for item in first:
+        assert image_utils.needs_thumbnail(item)
+        image_utils.generate_thumbnail(item["library_path"], item["thumbnail_path"])
+
+    # Same content as red.png, once from an earlier import and once within the batch
+    second = import_batch(library, [red_copy, red], "cats")
+    for item in second:
+        assert item["content_hash"] == first[0]["content_hash"]
+        assert item["subfolder"] == "cats"
+        assert not image_utils.needs_thumbnail(item) # The thumbnail is linked as well
+        assert os.path.samefile(item["library_path"], first[0]["library_path"])
+    assert second[0]["original_filename"] == "red_copy.png"
+
+    assert len(library.data) == 4
+    assert set(library.subfolder_index()) == {"", "cats"}
+    assert library.hash_index()[first[1]["content_hash"]] == first[1]["image_id"]
+
+
+def test_known_content_entries_follow_the_store(library, tmp_path, make_image):
+    [red] = import_batch(library, [make_image(tmp_path / "red.png", "red")])
+    assert image_utils.known_content_entries() == {red["content_hash"]: library.data[red["image_id"]]}
+
+    library.remove(red["image_id"])
+    assert image_utils.known_content_entries() == {}
+
+
+def test_import_within_a_batch_links_to_new_copies(library, tmp_path, make_image):
+    red = make_image(tmp_path / "red.png", "red")
+    known_entries = {}
+    first_id, first = image_utils.import_file(str(red), "", known_entries)
+    assert known_entries == {first["content_hash"]: first}
+
+    second_id, second = image_utils.import_file(str(red), "", known_entries)
+    assert second_id != first_id
+    assert os.path.samefile(second["library_path"], first["library_path"])
+    assert known_entries == {first["content_hash"]: first}
+
+
+def test_import_copies_when_the_duplicate_is_gone(library, tmp_path, make_image):
+    red = make_image(tmp_path / "red.png", "red")
+    [first] = import_batch(library, [red])
+    os.remove(first["library_path"])
+
+    [second] = import_batch(library, [red])
+    assert os.path.exists(second["library_path"])
+    assert not os.path.samefile(second["library_path"], red)
+    assert image_utils.needs_thumbnail(second)
+
+
+def test_import_of_an_unreadable_file_raises_and_leaves_the_batch_intact(library, tmp_path, make_image):
+    known_entries = image_utils.known_content_entries()
+    with pytest.raises(OSError):
+        image_utils.import_file(str(tmp_path / "missing.png"), "", known_entries)
+    assert known_entries == {}
+    assert not any(image_utils.LIBRARY_DIR.iterdir())
+
+    image_id, entry = image_utils.import_file(str(make_image(tmp_path / "red.png", "red")), "", known_entries)
+    assert list(known_entries.values()) == [entry]
+
+
+@pytest.mark.parametrize("subfolder, expected", [("", ""), ("cats", "cats"), ("cats/small", "cats/small"),
+                                                 ("cats\\small", "cats/small")])
+def test_normalize_subfolder(subfolder, expected):
+    assert image_utils.normalize_subfolder(subfolder) == expected
+
+
+def test_upscaled_images_store_normalized_subfolders(library):
+    image_id, entry = image_utils.save_upscaled_image(Image.new("RGB", (80, 60), "red"), "red.png", "cats\\small")
+    assert entry["subfolder"] == "cats/small"
+    assert (entry["width"], entry["height"]) == (80, 60)
+    assert os.path.exists(entry["library_path"]) and os.path.exists(entry["thumbnail_path"])
@@ -0,0 +1,35 @@
+from pathlib import Path
+
+import pytest
+from PySide6.QtCore import QThreadPool
+from PySide6.QtWidgets import QApplication
+
+from image_manager import image_utils
+from image_manager.widgets.thumbnail_gallery import ThumbnailGallery
+
+
+@pytest.fixture
+def gallery(library):
+    app = QApplication.instance() or QApplication([])
+    gallery = ThumbnailGallery()
+    yield gallery
+    QThreadPool.globalInstance().waitForDone()
+    app.processEvents()
+    gallery.deleteLater()
+
+
+def test_image_deleted_while_its_thumbnail_is_pending(gallery, library, tmp_path, make_image):
+    path = make_image(tmp_path / "red.png", "red")
+    image_id, entry = image_utils.import_file(str(path), "", image_utils.known_content_entries())
+    library.add(image_id, entry)
+    gallery.queue_thumbnails([dict(entry, image_id=image_id)])
+    # The worker's result is only delivered once the event loop runs, i.e. after the deletion
+    QThreadPool.globalInstance().waitForDone()
+    assert image_id in gallery.pending_thumbnails
+
+    image_utils.remove_image_files(image_id)
+    QApplication.processEvents()
+
+    assert not gallery.pending_thumbnails
+    assert not Path(entry["thumbnail_path"]).exists() # The orphaned thumbnail is removed
+    assert image_id not in library.data